@@ -12,6 +12,7 @@ from collapsi.utilities.vprint import vprint
 # Play two CSBs against each other
 # --------------------------
 if __name__ == "__main__":
+    solver_cache = TranspositionTable()  # shared by every turn of every game
     csb1_wins = 0
     csb2_wins = 0
     for i in range(10):
@@ -28,17 +29,17 @@ if __name__ == "__main__":
             # ---- CSB1 turn ----
             vprint("CSB1 possible moves:", game.get_current_player_moves())
             vprint("CSB1 is thinking...")
-            s = Solver(game)
+            s = Solver(game, memo=solver_cache)
             win, moves = s.best_moves(game)
             if win:
                 if isinstance(moves, list):
                     move = random.choice(moves)
                 else:
                     move = moves
-                vprint("After considering {} possible game states, CSB1 thinks it can win with move: {}".format(len(s.memoized_states.keys()), move))
+                vprint("After considering {} possible game states, CSB1 thinks it can win with move: {}".format(s.nodes, move))
             else:
                 move = random.choice(game.get_current_player_moves())
-                vprint("After considering {} possible game states, CSB1 thinks it cannot win, so it takes a random move: {}".format(len(s.memoized_states.keys()), move))
+                vprint("After considering {} possible game states, CSB1 thinks it cannot win, so it takes a random move: {}".format(s.nodes, move))
 
             game.make_move(game.current_player, move)
             game.next_player()
@@ -52,17 +53,17 @@ if __name__ == "__main__":
             # ---- CSB2 turn ----
             vprint("CSB2 possible moves:", game.get_current_player_moves())
             vprint("CSB2 is thinking...")
-            s = Solver(game)
+            s = Solver(game, memo=solver_cache)
             win, moves = s.best_moves(game)
             if win:
                 if isinstance(moves, list):
                     move = random.choice(moves)
                 else:
                     move = moves
-                vprint("After considering {} possible game states, CSB2 thinks it can win with move: {}".format(len(s.memoized_states.keys()), move))
+                vprint("After considering {} possible game states, CSB2 thinks it can win with move: {}".format(s.nodes, move))
             else:
                 move = random.choice(game.get_current_player_moves())
-                vprint("After considering {} possible game states, CSB2 thinks it cannot win, so it takes a random move: {}".format(len(s.memoized_states.keys()), move))
+                vprint("After considering {} possible game states, CSB2 thinks it cannot win, so it takes a random move: {}".format(s.nodes, move))
 
             game.make_move(game.current_player, move)
             game.next_player()
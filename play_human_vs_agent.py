@@ -1,15 +1,14 @@
 import pygame
-import torch
-import numpy as np
 from collapsi.modules.card import Card
 from collapsi.modules.game import GameState
-from collapsi.modules.agent import DQNAgent, encode_state, encode_action, decode_action
+from collapsi.modules.encoding import encode_state
+from collapsi.modules.inference import load_policy
 
 # --- Constants ---
 TILE_SIZE = 100
 WIDTH, HEIGHT = 4 * TILE_SIZE, 4 * TILE_SIZE
 FPS = 60
-MODEL_PATH = "collapsi_model.pth"
+MODEL_PATH = None  # None: the model exported by train.py, or its .pth state dict if there is no export
 
 # --- Drawing Helpers ---
 def draw_text(screen, text, position, font_size=24):
@@ -49,9 +48,7 @@ def play_human_vs_ai():
     game.players[1].name = 'AI'
     current_player = game.players[0]
 
-    agent = DQNAgent()
-    agent.model.load_state_dict(torch.load(MODEL_PATH))
-    agent.model.eval()
+    agent = load_policy(MODEL_PATH)
 
     running = True
     while running:
@@ -89,13 +86,7 @@ def play_human_vs_ai():
                 break
 
             state_vec = encode_state(game, agent_name='AI')
-            legal_indices = [encode_action(r, c) for (r, c) in legal_moves]
-            q_vals = agent.model(torch.tensor(state_vec)).detach().numpy()
-            best_move = None
-            for idx in np.argsort(q_vals)[::-1]:
-                if idx in legal_indices:
-                    best_move = decode_action(idx)
-                    break
+            best_move = agent.select_move(state_vec, legal_moves)
 
             if best_move:
                 pygame.time.delay(500)  # Slow down AI move a bit
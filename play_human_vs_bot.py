@@ -8,6 +8,7 @@ from collapsi.utilities.vprint import vprint
 # Interactive play human vs bot
 # --------------------------
 if __name__ == "__main__":
+    solver_cache = TranspositionTable()  # shared by every turn of every game
     game = GameState(num_players=2)
     game.players[0].name = 'P1'
     game.players[1].name = 'P2'
@@ -36,17 +37,17 @@ if __name__ == "__main__":
         # ---- Bot move ----
         print("Bot's possible moves:", game.get_current_player_moves())
         print("Bot is thinking...")
-        s = Solver(game)
+        s = Solver(game, memo=solver_cache)
         win, moves = s.best_moves(game)
         if win:
             if isinstance(moves, list):
                 bot_move = random.choice(moves)
             else:
                 bot_move = moves
-            print("After considering {} possible game states, Bot thinks it can win with move: {}".format(len(s.memoized_states.keys()), bot_move))
+            print("After considering {} possible game states, Bot thinks it can win with move: {}".format(s.nodes, bot_move))
         else:
             bot_move = random.choice(game.get_current_player_moves())
-            print("After considering {} possible game states, Bot thinks it cannot win, so it takes a random move: {}".format(len(s.memoized_states.keys()), bot_move))
+            print("After considering {} possible game states, Bot thinks it cannot win, so it takes a random move: {}".format(s.nodes, bot_move))
 
         game.make_move(game.current_player, bot_move)
         game.next_player()
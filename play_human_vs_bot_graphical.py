@@ -1,7 +1,9 @@
+import copy
 import pygame
 import random
 from collapsi.configs.configs import *
 from collapsi.modules.game import *
+from collapsi.utilities.ponder import Ponderer
 from collapsi.utilities.solver import *
 from collapsi.utilities.vprint import vprint
 
@@ -17,15 +19,23 @@ TEXT_COLOR = (0, 0, 0)
 SCREEN_MARGIN = 50
 FONT = pygame.font.SysFont(None, 30)
 PERFORM_BOT_ANALYSIS = False
+BOT_PONDERING = True  # solve the bot's replies in the background while the human thinks
+FPS = 60
+SOLVER_CACHE = TranspositionTable()  # reused by every solve, so later turns mostly hit the cache
 
 def evaluate_human_move(prev_game, new_game):
     """Return bot commentary about the human's move."""
-    s_prev = Solver(prev_game)
-    human_win_before, _ = s_prev.best_moves(prev_game)
+    # Each analysis gets half the time budget so the UI never blocks for long
+    s_prev = Solver(prev_game, memo=SOLVER_CACHE)
+    human_win_before, _, proven_before = s_prev.timed_best_moves(prev_game, SOLVER_TIME_BUDGET / 2)
 
-    s_new = Solver(new_game)
-    human_win_after, _ = s_new.best_moves(new_game)
+    # new_game is from the bot's point of view: the human is winning if the bot is losing
+    s_new = Solver(new_game, memo=SOLVER_CACHE)
+    bot_win_after, _, proven_after = s_new.timed_best_moves(new_game, SOLVER_TIME_BUDGET / 2)
+    human_win_after = not bot_win_after
 
+    if not (proven_before and proven_after):
+        return "Bot Analysis: Unsure..."
     if human_win_before and not human_win_after:
         return "Bot Analysis: That was a blunder!"
     elif not human_win_before and human_win_after:
@@ -137,6 +147,10 @@ if __name__ == "__main__":
 
     waiting_for_input = False  # flag for end-of-game
 
+    ponderer = Ponderer(SOLVER_CACHE)
+    if BOT_PONDERING:
+        ponderer.start(game)
+
     while running:
         mouse_pos = pygame.mouse.get_pos()
         draw_board(screen, game, bot_info, mouse_pos)
@@ -153,8 +167,9 @@ if __name__ == "__main__":
             if human_turn and event.type == pygame.MOUSEBUTTONDOWN:
                 move = get_cell_from_mouse(event.pos, game)
                 if move in game.get_current_player_moves():
+                    ponderer.stop()
+
                     # copy state for evaluation
-                    import copy
                     prev_game = copy.deepcopy(game)
 
                     game.make_move(game.current_player, move)
@@ -168,30 +183,34 @@ if __name__ == "__main__":
                         bot_info.append(commentary)
 
         if not human_turn and not game.is_terminal and not waiting_for_input:
-            s = Solver(game)
-            win, moves = s.best_moves(game)
-            if win:
+            s = Solver(game, memo=SOLVER_CACHE)
+            win, moves, proven = s.timed_best_moves(game, SOLVER_TIME_BUDGET)
+            if win or not proven:
+                # A proven winning move, or the best move found before the deadline
                 bot_move = random.choice(moves) if isinstance(moves, list) else moves
             else:
                 bot_move = random.choice(game.get_current_player_moves())
+            can_win = ('Yes' if win else 'No') if proven else 'Unsure'
 
             if not bot_info:
                 bot_info = [
                     f"Bot thinking...",
-                    f"Can win? {'Yes' if win else 'No'}",
+                    f"Can win? {can_win}",
                     f"Move chosen: {bot_move}",
-                    f"States considered: {len(s.memoized_states.keys())}"
+                    f"States considered: {s.nodes}"
                 ]
             else:
                 bot_info.append("Bot thinking...")
-                bot_info.append(f"Can win? {'Yes' if win else 'No'}")
+                bot_info.append(f"Can win? {can_win}")
                 bot_info.append(f"Move chosen: {bot_move}")
-                bot_info.append(f"States considered: {len(s.memoized_states.keys())}")
+                bot_info.append(f"States considered: {s.nodes}")
 
             pygame.time.wait(500)
             game.make_move(game.current_player, bot_move)
             game.next_player()
             human_turn = True
+            if BOT_PONDERING and not game.is_terminal:
+                ponderer.start(game)
 
         if game.is_terminal and not waiting_for_input:
             bot_info.append("Game Over!")
@@ -201,4 +220,6 @@ if __name__ == "__main__":
                 bot_info.append("YOU WIN")
             waiting_for_input = True  # now wait for player input
 
-        clock.tick(30)
+        clock.tick(FPS)
+
+    ponderer.stop()
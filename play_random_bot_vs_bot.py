@@ -12,6 +12,7 @@ from collapsi.utilities.vprint import vprint
 # Play random bot against CSB
 # --------------------------
 if __name__ == "__main__":
+    solver_cache = TranspositionTable()  # shared by every turn of every game
     random_bot_wins = 0
     csb_wins = 0
     for i in range(1000):
@@ -42,17 +43,17 @@ if __name__ == "__main__":
             # ---- CSB turn ----
             vprint("CSB possible moves:", game.get_current_player_moves())
             vprint("CSB is thinking...")
-            s = Solver(game)
+            s = Solver(game, memo=solver_cache)
             win, moves = s.best_moves(game)
             if win:
                 if isinstance(moves, list):
                     move = random.choice(moves)
                 else:
                     move = moves
-                vprint("After considering {} possible game states, CSB thinks it can win with move: {}".format(len(s.memoized_states.keys()), move))
+                vprint("After considering {} possible game states, CSB thinks it can win with move: {}".format(s.nodes, move))
             else:
                 move = random.choice(game.get_current_player_moves())
-                vprint("After considering {} possible game states, CSB thinks it cannot win, so it takes a random move: {}".format(len(s.memoized_states.keys()), move))
+                vprint("After considering {} possible game states, CSB thinks it cannot win, so it takes a random move: {}".format(s.nodes, move))
 
             game.make_move(game.current_player, move)
             game.next_player()
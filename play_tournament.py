@@ -0,0 +1,19 @@
+"""
+Play two bots against each other over all cores, e.g.
+    python play_tournament.py solver random --games 100000
+    python play_tournament.py solver solver --games 10000
+"""
+
+import argparse
+from collapsi.utilities.tournament import POLICIES, run_tournament, report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collapsi tournament between two policies")
+    parser.add_argument("first", choices=sorted(POLICIES))
+    parser.add_argument("second", choices=sorted(POLICIES))
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report(run_tournament(args.first, args.second, games=args.games, workers=args.workers, seed=args.seed))
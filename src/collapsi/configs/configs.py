@@ -25,10 +25,75 @@ NUM_ROUNDS = 50000
 LOAD_DQN_MODEL = False
 SAVE_DQN_MODEL = True
 DQN_MODEL_NAME = "collapsi_model.pth"
+DQN_INFERENCE_MODEL_NAME = "collapsi_model.pt" # Frozen TorchScript export of the model for playing (see inference.py)
+DQN_QUANTIZE_INFERENCE = True # Quantize the exported model's linear layers to int8
+DQN_CHECKPOINT_DIR = "collapsi_checkpoint" # Full training state (networks, optimizer, replay buffer) for resuming
+RESUME_DQN_TRAINING = False # Resume train.py from DQN_CHECKPOINT_DIR instead of starting over
+DQN_CHECKPOINT_EVERY = 10000 # Episodes between checkpoints during training (0: only at the end)
 AGENT_EXPLORING = True
 
 AGENT_REWARDS = {
     "LOSS": -10.0,
     "SURVIVE_ANOTHER_ROUND": 1,
     "WIN": 20.0,
-}
\ No newline at end of file
+}
+
+# Seed for the Zobrist hashing keys. Fixed so hashes (and cached solver results) agree across processes and runs
+ZOBRIST_SEED = 20250101
+
+# Treat positions related by a torus translation and/or rotation/reflection as one solver memo entry.
+# Within a single deal the card layout rarely maps onto itself, so this saves few entries for roughly
+# twice the cost per node; it pays off when one memo is shared across many deals.
+SOLVER_USE_SYMMETRY = False
+
+# Upper bound on the entries kept by a shared solver TranspositionTable (least recently used are evicted first).
+# Each entry costs roughly 100 bytes, so 5M entries is ~500MB.
+SOLVER_CACHE_MAX_ENTRIES = 5_000_000
+
+# Once collapsed tiles separate the players, settle the position by comparing how many moves each
+# can still make in its own region instead of searching both players' moves interleaved.
+# On the 4x4 board the players only get separated with a few tiles left, where the interleaved
+# search is already small, so the connectivity check at every node costs more than it saves.
+SOLVER_DECOMPOSE_REGIONS = False
+
+# Hash non-collapsed tiles that neither player can reach any more as if they had collapsed,
+# so positions that only differ in such dead tiles share one solver memo entry
+SOLVER_NORMALIZE_DEAD_TILES = True
+
+# Number of processes Solver.best_moves splits the root moves across. 1 searches in the calling process.
+SOLVER_WORKERS = 1
+
+# Order in which the solver tries moves below the root: "none", "mobility", "killer" or "history"
+SOLVER_MOVE_ORDERING = "killer"
+
+# Seconds the bot may think per move in interactive play (Solver.timed_best_moves)
+SOLVER_TIME_BUDGET = 2.0
+
+# Pondering (solving the bot's replies on the human's time) sleeps PONDER_YIELD_SECONDS every
+# PONDER_CHECK_INTERVAL nodes, handing the GIL to the UI thread so the frame rate holds
+PONDER_CHECK_INTERVAL = 128
+PONDER_YIELD_SECONDS = 0.001
+
+# Actor processes playing training games for train.py. 1 keeps the single-process train_dqn_agent loop
+DQN_ACTORS = 1
+
+# Learner updates between two publications of the DQN weights to the actors
+DQN_ACTOR_SYNC_INTERVAL = 200
+
+# Transitions each actor can have in flight (shared-memory ring) before it waits for the learner
+DQN_ACTOR_RING_SIZE = 4096
+
+# Games each training loop (train.py, and every actor) plays side by side through VecCollapsiEnv
+DQN_NUM_ENVS = 16
+
+# DQN training schedule: every DQN_UPDATE_EVERY environment transitions the learner runs
+# DQN_GRADIENT_STEPS updates on batches of DQN_BATCH_SIZE samples from the replay buffer
+DQN_BATCH_SIZE = 32
+DQN_UPDATE_EVERY = 1
+DQN_GRADIENT_STEPS = 1
+
+# Target network updates: "hard" copies the online network every DQN_TARGET_SYNC_INTERVAL updates,
+# "polyak" moves it DQN_TARGET_TAU of the way towards the online network after every update
+DQN_TARGET_UPDATE = "hard"
+DQN_TARGET_SYNC_INTERVAL = 1000
+DQN_TARGET_TAU = 0.005
@@ -2,6 +2,11 @@
 """
 
 
+import json
+import os
+import pickle
+import shutil
+import time
 import torch
 import torch.nn as nn
 import torch.optim as optim
@@ -9,6 +14,7 @@ import random
 import numpy as np
 from collections import deque
 from collapsi.configs.configs import *
+from collapsi.modules.encoding import *
 from collapsi.utilities.vprint import vprint
 
 # Q-learning constants
@@ -23,6 +29,8 @@ else:
 epsilon_decay=0.99999 # Decay in exploration rate
 gamma = 0.95  # Discount factor
 lr=1e-3 # Learning rate
+remember_flush_size = 64 # Transitions staged before their TD errors are estimated in one batched forward pass
+remember_flush_seconds = 1.0 # ...or once the oldest staged transition has waited this long
 
 # --- Neural Network for Q(s) -> Q(a) ---
 class DQN(nn.Module):
@@ -39,60 +47,231 @@ class DQN(nn.Module):
     def forward(self, x):
         return self.net(x)
 
+def masked_max(q_values, legal):
+    """Max Q-value over the legal actions of each row; 0 for rows without any (terminal states)."""
+    best = q_values.masked_fill(~legal, float('-inf')).max(1)[0]
+    return torch.where(legal.any(1), best, torch.zeros_like(best))
+
+# --- Segment tree for prioritized sampling ---
+class SegmentTree:
+    """
+    Binary tree over `capacity` leaves where every internal node holds `operation`
+    (np.add or np.maximum) of its two children, so the root holds the sum (or max)
+    of all leaves. Updates and prefix-sum searches touch O(log N) nodes, and both
+    are vectorized over many indices at once.
+    """
+    def __init__(self, capacity, operation, neutral):
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self.operation = operation
+        self.tree = np.full(2 * self.size, neutral, dtype=np.float64)
+
+    def update(self, indices, values):
+        nodes = np.asarray(indices) + self.size
+        self.tree[nodes] = values
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.operation(self.tree[2 * nodes], self.tree[2 * nodes + 1])
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    def root(self):
+        return self.tree[1]
+
+    def leaves(self, indices):
+        return self.tree[np.asarray(indices) + self.size]
+
+    def find_prefix_sum(self, targets):
+        """(Sum tree only) For each target, the leaf index where the running sum of leaves passes it."""
+        nodes = np.ones(len(targets), dtype=np.int64)
+        targets = np.array(targets, dtype=np.float64)
+        while nodes[0] < self.size:
+            left = 2 * nodes
+            go_right = targets > self.tree[left]
+            targets -= np.where(go_right, self.tree[left], 0.0)
+            nodes = left + go_right
+        return nodes - self.size
+
 # --- Prioritized Replay Buffer ---
 class PrioritizedReplayBuffer:
-    def __init__(self, capacity, alpha=0.6):
+    """
+    Transitions live in preallocated arrays, and priorities ** alpha in a sum tree
+    for O(log N) proportional sampling, so a sampled batch is a handful of array lookups.
+    A max tree over the raw priorities gives new transitions their priority in O(log N).
+    """
+    def __init__(self, capacity, alpha=0.6, state_dim=36, action_dim=16):
         self.capacity = capacity
-        self.buffer = []
-        self.priorities = np.zeros((capacity,), dtype=np.float32)
         self.alpha = alpha
+        self.states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+        self.next_legal = np.ones((capacity, action_dim), dtype=bool)  # legal actions in next_state
+        self.priorities = np.zeros((capacity,), dtype=np.float32)  # raw (un-exponentiated) priorities
+        self.sum_tree = SegmentTree(capacity, np.add, 0.0)
+        self.max_tree = SegmentTree(capacity, np.maximum, 0.0)
         self.pos = 0
+        self.size = 0
+        self.mapped = False  # whether the arrays are memory-mapped from files (see load)
+
+    def __len__(self):
+        return self.size
+
+    def set_priorities(self, indices, priorities):
+        self.priorities[indices] = priorities
+        # From the stored float32 values, so that load() rebuilds exactly the same trees
+        scaled = self.priorities[indices].astype(np.float64) ** self.alpha
+        self.sum_tree.update(indices, scaled)
+        self.max_tree.update(indices, self.priorities[indices])  # as stored, in float32
+
+    def add_batch(self, states, actions, rewards, next_states, dones, next_legal, td_errors):
+        """
+        Add many transitions at once, with exactly the priorities add() would have given
+        them one after the other: max(td_error + 1e-5, the largest priority in the buffer),
+        where the largest priority still counts the slot about to be overwritten and every
+        transition added before. The first transition of an empty buffer gets 1.0.
+        """
+        n = len(actions)
+        if n > self.capacity:
+            for start in range(0, n, self.capacity):
+                end = start + self.capacity
+                self.add_batch(states[start:end], actions[start:end], rewards[start:end], next_states[start:end],
+                               dones[start:end], next_legal[start:end], td_errors[start:end])
+            return
+        indices = (self.pos + np.arange(n)) % self.capacity
+        # Largest old priority from each slot of the batch on, then over the slots it leaves alone
+        overwritten = np.maximum.accumulate(self.priorities[indices][::-1])[::-1]
+        self.max_tree.update(indices, np.zeros(n))
+        priorities = np.maximum(np.asarray(td_errors, dtype=np.float64) + 1e-5,
+                                np.maximum(overwritten, self.max_tree.root()))
+        if not self.size:
+            priorities[0] = 1.0
+        priorities = np.maximum.accumulate(priorities)
+        self.states[indices] = states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.next_states[indices] = next_states
+        self.dones[indices] = dones
+        self.next_legal[indices] = next_legal
+        self.set_priorities(indices, priorities)
+        self.pos = (self.pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
 
     def add(self, transition, td_error):
-        max_priority = max(self.priorities.max(), td_error + 1e-5) if self.buffer else 1.0
-        if len(self.buffer) < self.capacity:
-            self.buffer.append(transition)
-        else:
-            self.buffer[self.pos] = transition
-        self.priorities[self.pos] = max_priority
-        self.pos = (self.pos + 1) % self.capacity
+        state, action, reward, next_state, done, next_legal = transition
+        self.add_batch([state], [action], [reward], [next_state], [done], [next_legal], [td_error])
 
     def sample(self, batch_size, beta=0.4):
-        if len(self.buffer) == self.capacity:
-            prios = self.priorities
-        else:
-            prios = self.priorities[:self.pos]
-        probs = prios ** self.alpha
-        probs /= probs.sum()
-
-        indices = np.random.choice(len(self.buffer), batch_size, p=probs)
-        samples = [self.buffer[i] for i in indices]
-
-        total = len(self.buffer)
-        weights = (total * probs[indices]) ** (-beta)
+        # Stratified: one uniform draw from each of batch_size equal slices of the total priority
+        total = self.sum_tree.root()
+        targets = (np.arange(batch_size) + np.random.random(batch_size)) * (total / batch_size)
+        indices = np.minimum(self.sum_tree.find_prefix_sum(targets), self.size - 1)
+
+        probs = self.sum_tree.leaves(indices) / total
+        weights = (self.size * probs) ** (-beta)
         weights /= weights.max()
 
-        return samples, indices, weights
+        samples = (self.states[indices], self.actions[indices], self.rewards[indices],
+                   self.next_states[indices], self.dones[indices], self.next_legal[indices])
+        return samples, indices, weights.astype(np.float32)
 
     def update_priorities(self, indices, td_errors):
-        for idx, error in zip(indices, td_errors):
-            self.priorities[idx] = abs(error) + 1e-5
+        self.set_priorities(indices, np.abs(td_errors) + 1e-5)
+
+    ARRAYS = ("states", "actions", "rewards", "next_states", "dones", "next_legal", "priorities")
+
+    def save(self, directory):
+        """Write the buffer to directory as one .npy file per array, plus buffer.json for the rest."""
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            stored = np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), mode="w+",
+                                               dtype=array.dtype, shape=array.shape)
+            stored[:] = array
+            stored.flush()
+            del stored
+        with open(os.path.join(directory, "buffer.json"), "w") as f:
+            json.dump({"capacity": self.capacity, "alpha": self.alpha, "pos": self.pos, "size": self.size}, f)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Load a buffer written by save(). The arrays are memory-mapped copy-on-write:
+        nothing is read until it is used, and training never writes back to the files.
+        """
+        with open(os.path.join(directory, "buffer.json")) as f:
+            meta = json.load(f)
+        buffer = cls.__new__(cls)
+        buffer.capacity = meta["capacity"]
+        buffer.alpha = meta["alpha"]
+        buffer.pos = meta["pos"]
+        buffer.size = meta["size"]
+        buffer.remap(directory)
+        buffer.sum_tree = SegmentTree(buffer.capacity, np.add, 0.0)
+        buffer.max_tree = SegmentTree(buffer.capacity, np.maximum, 0.0)
+        if buffer.size:
+            buffer.set_priorities(np.arange(buffer.size), buffer.priorities[:buffer.size])
+        return buffer
+
+    def remap(self, directory):
+        """
+        Memory-map the arrays from the files save() wrote to directory, which must hold
+        the buffer's current contents. Any files mapped before are let go of.
+        """
+        for name in self.ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="c"))
+        self.mapped = True
+
+def _latest_version(directory):
+    """Name of the checkpoint version LATEST points to in directory, or None."""
+    try:
+        with open(os.path.join(directory, "LATEST")) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
 
 # --- DQN Agent ---
 class DQNAgent:
-    def __init__(self, state_dim=36, action_dim=16, gamma=gamma, epsilon=epsilon, epsilon_min=epsilon_min, epsilon_decay=epsilon_decay, lr=lr):
+    def __init__(self, state_dim=36, action_dim=16, gamma=gamma, epsilon=epsilon, epsilon_min=epsilon_min, epsilon_decay=epsilon_decay, lr=lr, remember_flush_size=remember_flush_size,
+                 remember_flush_seconds=remember_flush_seconds,
+                 batch_size=DQN_BATCH_SIZE, update_every=DQN_UPDATE_EVERY, gradient_steps=DQN_GRADIENT_STEPS,
+                 target_update=DQN_TARGET_UPDATE, target_sync_interval=DQN_TARGET_SYNC_INTERVAL, tau=DQN_TARGET_TAU):
+        assert target_update in ("hard", "polyak"), f"Unknown target update {target_update!r}"
         self.model = DQN(state_dim, action_dim)
         self.target_model = DQN(state_dim, action_dim)
         self.target_model.load_state_dict(self.model.state_dict())
         self.optimizer = optim.Adam(self.model.parameters(), lr=lr)
         self.criterion = nn.MSELoss()
-        self.buffer = PrioritizedReplayBuffer(capacity=100_000)
+        self.buffer = PrioritizedReplayBuffer(capacity=100_000, state_dim=state_dim, action_dim=action_dim)
         self.gamma = gamma
         self.epsilon = epsilon
         self.epsilon_min = epsilon_min
         self.epsilon_decay = epsilon_decay
         self.action_dim = action_dim
-        self.steps = 0
+        self.steps = 0  # gradient updates so far
+
+        # Training schedule (see learn)
+        self.batch_size = batch_size
+        self.update_every = update_every
+        self.gradient_steps = gradient_steps
+        self.target_update = target_update
+        self.target_sync_interval = target_sync_interval
+        self.tau = tau
+        self.env_steps = 0  # transitions seen by learn
+
+        # Staging area for remember(): priorities are estimated once per flush, not per transition
+        self.remember_flush_size = remember_flush_size
+        self.remember_flush_seconds = remember_flush_seconds
+        self.staged_states = np.zeros((remember_flush_size, state_dim), dtype=np.float32)
+        self.staged_actions = np.zeros(remember_flush_size, dtype=np.int64)
+        self.staged_rewards = np.zeros(remember_flush_size, dtype=np.float32)
+        self.staged_next_states = np.zeros((remember_flush_size, state_dim), dtype=np.float32)
+        self.staged_dones = np.zeros(remember_flush_size, dtype=np.float32)
+        self.staged_next_legal = np.ones((remember_flush_size, action_dim), dtype=bool)
+        self.staged = 0
+        self.staged_since = 0.0  # time.perf_counter() when the oldest staged transition arrived
 
     def select_action(self, state_vec):
         if random.random() < self.epsilon:
@@ -101,35 +280,150 @@ class DQNAgent:
             q_vals = self.model(torch.tensor(state_vec, dtype=torch.float32))
             return torch.argmax(q_vals).item()
 
+    def select_actions(self, states, legal_masks):
+        """
+        Greedy actions for a batch: states is (N, state_dim), legal_masks an (N, action_dim)
+        boolean array of the legal actions. Returns the (N,) best legal action indices.
+        """
+        with torch.no_grad():
+            q_vals = self.model(torch.as_tensor(states, dtype=torch.float32))
+            return q_vals.masked_fill(~torch.as_tensor(legal_masks), float('-inf')).argmax(1).numpy()
+
     # def remember(self, state, action, reward, next_state, done):
     #     self.buffer.append((state, action, reward, next_state, done))
 
-    def remember(self, state, action, reward, next_state, done):
-        # Estimate TD error for prioritization
+    def remember(self, state, action, reward, next_state, done, next_legal=None):
+        # next_legal: boolean mask of the legal actions in next_state (all of them if not given)
+        # Stage the transition; its TD error is estimated together with the others on flush
+        i = self.staged
+        if not i:
+            self.staged_since = time.perf_counter()
+        self.staged_states[i] = state
+        self.staged_actions[i] = action
+        self.staged_rewards[i] = reward
+        self.staged_next_states[i] = next_state
+        self.staged_dones[i] = done
+        self.staged_next_legal[i] = True if next_legal is None else next_legal
+        self.staged += 1
+        if (self.staged == self.remember_flush_size
+                or time.perf_counter() - self.staged_since >= self.remember_flush_seconds):
+            self.flush_remembered()
+
+    def flush_remembered(self):
+        """Estimate the TD errors of all staged transitions in one forward pass and add them to the buffer."""
+        n = self.staged
+        if not n:
+            return
+        states = torch.from_numpy(self.staged_states[:n])
+        actions = torch.from_numpy(self.staged_actions[:n])
+        rewards = torch.from_numpy(self.staged_rewards[:n])
+        next_states = torch.from_numpy(self.staged_next_states[:n])
+        dones = torch.from_numpy(self.staged_dones[:n])
+        next_legal = torch.from_numpy(self.staged_next_legal[:n])
         with torch.no_grad():
-            q_val = self.model(torch.tensor(state, dtype=torch.float32))[action].item()
-            next_q = self.target_model(torch.tensor(next_state, dtype=torch.float32)).max().item()
-            target = reward if done else reward + self.gamma * next_q
-            td_error = abs(q_val - target)
-
-        self.buffer.add((state, action, reward, next_state, done), td_error)
-
-    def update_model(self, batch_size=32, beta=0.4):
-        if len(self.buffer.buffer) < batch_size:
+            q_vals = self.model(states).gather(1, actions.unsqueeze(1)).squeeze(1)
+            next_q = masked_max(self.target_model(next_states), next_legal)
+            targets = rewards + self.gamma * next_q * (1 - dones)
+            td_errors = (q_vals - targets).abs().numpy()
+
+        self.buffer.add_batch(self.staged_states[:n], self.staged_actions[:n], self.staged_rewards[:n],
+                              self.staged_next_states[:n], self.staged_dones[:n], self.staged_next_legal[:n], td_errors)
+        self.staged = 0
+
+    def learn(self, transitions=1):
+        """
+        Tell the agent that `transitions` more environment transitions were remembered, and
+        run the training schedule: gradient_steps updates every update_every transitions.
+        """
+        previous = self.env_steps
+        self.env_steps += transitions
+        due = self.env_steps // self.update_every - previous // self.update_every
+        for _ in range(due * self.gradient_steps):
+            self.update_model()
+
+    def save_checkpoint(self, directory=DQN_CHECKPOINT_DIR, progress=None):
+        """
+        Save everything needed to resume training: both networks, the optimizer,
+        epsilon, the step counters, the replay buffer (see PrioritizedReplayBuffer.save),
+        the Python, NumPy and torch RNG states, and `progress`: anything the training
+        loop needs to carry on where it stopped (episode count, environments...).
+
+        Each save goes to a new numbered version inside directory. Only once it is
+        complete is the LATEST file atomically pointed at it (os.replace), and only then
+        are older versions removed, so an interrupted save always leaves the previous
+        checkpoint in place.
+        """
+        self.flush_remembered()  # staged transitions belong in the buffer
+        os.makedirs(directory, exist_ok=True)
+        latest = _latest_version(directory)
+        name = f"version-{int(latest.rsplit('-', 1)[1]) + 1 if latest else 1:06d}"
+        version = os.path.join(directory, name)
+        shutil.rmtree(version, ignore_errors=True)  # left over by an interrupted save
+        os.makedirs(version)
+        self.buffer.save(version)
+        torch.save({
+            "model": self.model.state_dict(),
+            "target_model": self.target_model.state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+            "epsilon": self.epsilon,
+            "steps": self.steps,
+            "env_steps": self.env_steps,
+        }, os.path.join(version, "agent.pt"))
+        with open(os.path.join(version, "progress.pkl"), "wb") as f:
+            pickle.dump({"progress": progress, "python_rng": random.getstate(),
+                         "numpy_rng": np.random.get_state(), "torch_rng": torch.get_rng_state()}, f)
+
+        pointer = os.path.join(directory, "LATEST")
+        with open(pointer + ".tmp", "w") as f:
+            f.write(name)
+        os.replace(pointer + ".tmp", pointer)
+
+        # A resumed buffer still maps the files of the version it was loaded from (which
+        # Windows will not delete): map the identical new ones instead, then clean up
+        if self.buffer.mapped:
+            self.buffer.remap(version)
+        for entry in os.listdir(directory):
+            if entry.startswith("version-") and entry != name:
+                shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)  # else retried next save
+
+    def load_checkpoint(self, directory=DQN_CHECKPOINT_DIR):
+        """
+        Resume from a checkpoint written by save_checkpoint, restoring the RNG states too.
+        Returns the progress that was saved with it (None if there was none).
+        """
+        latest = _latest_version(directory)
+        version = os.path.join(directory, latest) if latest else directory  # older checkpoints had no versions
+        checkpoint = torch.load(os.path.join(version, "agent.pt"))
+        self.model.load_state_dict(checkpoint["model"])
+        self.target_model.load_state_dict(checkpoint["target_model"])
+        self.optimizer.load_state_dict(checkpoint["optimizer"])
+        self.epsilon = checkpoint["epsilon"]
+        self.steps = checkpoint["steps"]
+        self.env_steps = checkpoint["env_steps"]
+        self.buffer = PrioritizedReplayBuffer.load(version)
+        self.staged = 0
+        progress_path = os.path.join(version, "progress.pkl")
+        if not os.path.exists(progress_path):
+            return None
+        with open(progress_path, "rb") as f:
+            saved = pickle.load(f)
+        random.setstate(saved["python_rng"])
+        np.random.set_state(saved["numpy_rng"])
+        torch.set_rng_state(saved["torch_rng"])
+        return saved["progress"]
+
+    def update_model(self, batch_size=None, beta=0.4):
+        batch_size = batch_size or self.batch_size
+        if len(self.buffer) < batch_size:
             return
 
         batch, indices, weights = self.buffer.sample(batch_size, beta)
-        states, actions, rewards, next_states, dones = zip(*batch)
-
-        states = torch.tensor(states, dtype=torch.float32)
-        actions = torch.tensor(actions).unsqueeze(1)
-        rewards = torch.tensor(rewards, dtype=torch.float32)
-        next_states = torch.tensor(next_states, dtype=torch.float32)
-        dones = torch.tensor(dones, dtype=torch.float32)
-        weights = torch.tensor(weights, dtype=torch.float32)
+        states, actions, rewards, next_states, dones, next_legal = (torch.from_numpy(array) for array in batch)
+        actions = actions.unsqueeze(1)
+        weights = torch.from_numpy(weights)
 
         q_values = self.model(states).gather(1, actions).squeeze(1)
-        next_q = self.target_model(next_states).max(1)[0]
+        next_q = masked_max(self.target_model(next_states), next_legal)  # illegal moves must not bootstrap
         target_q = rewards + self.gamma * next_q * (1 - dones)
 
         loss = (self.criterion(q_values, target_q.detach()) * weights).mean()
@@ -144,46 +438,11 @@ class DQNAgent:
         # Epsilon decay
         self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay)
 
-        # Soft update
+        # Target network update
         self.steps += 1
-        if self.steps % 1000 == 0:
+        if self.target_update == "polyak":
+            with torch.no_grad():
+                for target, online in zip(self.target_model.parameters(), self.model.parameters()):
+                    target.lerp_(online, self.tau)
+        elif self.steps % self.target_sync_interval == 0:
             self.target_model.load_state_dict(self.model.state_dict())
-
-# --- Utility to encode the game state into a vector ---
-def encode_state(state, agent_name):
-    # Encode board: each tile = [card_value, collapsed_flag]
-    flat_board = []
-    for row in state.board:
-        for card in row:
-            # card_val = CARD_NUMERIC[card.value]
-            # collapsed = 1.0 if card.collapsed else 0.0
-            # flat_board.extend([card_val / 4.0, collapsed])  # Normalize card value
-            card_val = CARD_TO_NUM_NORMALIZED[card.value]
-            collapsed = 0.5 if card.collapsed else -0.5 # Centered around 0 for activation functions
-            flat_board.extend([card_val, collapsed])
-
-    # Encode player positions
-    agent_pos = None
-    enemy_pos = None
-    for p in state.players:
-        if p.name == agent_name:
-            agent_pos = p.position
-        else:
-            enemy_pos = p.position
-
-    # agent_vec = [agent_pos[0] / 4.0, agent_pos[1] / 4.0]
-    # enemy_vec = [enemy_pos[0] / 4.0, enemy_pos[1] / 4.0]
-
-    # Position: center from [0,4] --> [-0.5, 0.5]
-    agent_vec = [(agent_pos[0]-2) / 4.0, (agent_pos[1]-2) / 4.0]
-    enemy_vec = [(enemy_pos[0]-2) / 4.0, (enemy_pos[1]-2) / 4.0]
-
-    return np.array(flat_board + agent_vec + enemy_vec, dtype=np.float32) # 36 dimension
-
-# --- Utility to decode action index to (row, col) ---
-def decode_action(index):
-    return (index // 4, index % 4)
-
-# --- Utility to encode (row, col) to action index ---
-def encode_action(row, col):
-    return row * 4 + col
\ No newline at end of file
@@ -0,0 +1,163 @@
+"""
+Vectorized simulation of many games at once with NumPy.
+
+Each game is stored the same way as a BitboardState, one row per game:
+- codes: (N, TILE_COUNT) card codes (CARD_TO_NUM)
+- collapsed: (N,) bitmask of collapsed tiles
+- positions: (N, players) tile index of each player
+Legal moves come from the precomputed path tables in paths.py, padded into
+arrays so that a whole batch is checked with a few array operations.
+"""
+
+import numpy as np
+from collapsi.configs.configs import *
+from collapsi.modules.bitboard import DECK_CODES, JOKER_CODE
+from collapsi.modules.paths import *
+
+CODE_COUNT = max(CARD_TO_NUM.values()) + 1
+DECK = np.array(DECK_CODES, dtype=np.int8)
+TILE_BITS = np.int64(1) << np.arange(TILE_COUNT, dtype=np.int64)
+
+
+def _build_path_arrays():
+    """Pad MOVE_PATHS into PATH_DEST / PATH_MASK / PATH_VALID arrays indexed [origin, code, path]."""
+    code_to_card = {code: card for card, code in CARD_TO_NUM.items()}
+    tables = [[[(destination_bit.bit_length() - 1, mask)
+                for destination_bit, masks in MOVE_PATHS[origin][code_to_card[code]] for mask in masks]
+               if code in code_to_card else [] for code in range(CODE_COUNT)]
+              for origin in range(TILE_COUNT)]
+    width = max(len(paths) for by_code in tables for paths in by_code)
+    dest = np.zeros((TILE_COUNT, CODE_COUNT, width), dtype=np.int64)
+    mask = np.zeros((TILE_COUNT, CODE_COUNT, width), dtype=np.int64)
+    valid = np.zeros((TILE_COUNT, CODE_COUNT, width), dtype=bool)
+    for origin, by_code in enumerate(tables):
+        for code, paths in enumerate(by_code):
+            for i, (d, m) in enumerate(paths):
+                dest[origin, code, i] = d
+                mask[origin, code, i] = m
+                valid[origin, code, i] = True
+    return dest, mask, valid
+
+
+PATH_DEST, PATH_MASK, PATH_VALID = _build_path_arrays()
+
+
+def mask_to_bool(masks):
+    """Expand (N,) tile bitmasks into an (N, TILE_COUNT) boolean array."""
+    return (masks[:, None] & TILE_BITS) != 0
+
+
+def random_policy(batch, legal, rng):
+    """Pick a uniformly random legal tile in every game."""
+    scores = rng.random(legal.shape)
+    scores[~legal] = -1.0
+    return scores.argmax(axis=1)
+
+
+class BatchGameState:
+    def __init__(self, num_games, num_players=2, rng=None):
+        assert num_players <= 2, "Currently only 2 jokers exist in the deck"
+        self.num_games = num_games
+        self.num_players = num_players
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.games = np.arange(num_games)
+        self.reset()
+
+    def reset(self, games=None):
+        """Deal fresh boards for the given games (all of them by default)."""
+        if games is None:
+            games = self.games
+            self.codes = np.empty((self.num_games, TILE_COUNT), dtype=np.int8)
+            self.collapsed = np.zeros(self.num_games, dtype=np.int64)
+            self.positions = np.zeros((self.num_games, self.num_players), dtype=np.int64)
+            self.current = np.zeros(self.num_games, dtype=np.int64)
+            self.done = np.zeros(self.num_games, dtype=bool)
+            self.winner = np.full(self.num_games, -1, dtype=np.int64)
+            self.plies = np.zeros(self.num_games, dtype=np.int64)
+            self.legal = np.zeros(self.num_games, dtype=np.int64)
+        count = len(games)
+        if not count:
+            return
+        self.codes[games] = self.rng.permuted(np.tile(DECK, (count, 1)), axis=1)
+        self.collapsed[games] = 0
+        # Players start on the jokers, in row-major order (as in BitboardState.from_codes)
+        jokers = np.argsort(self.codes[games] != JOKER_CODE, axis=1, kind="stable")
+        self.positions[games] = jokers[:, :self.num_players]
+        self.current[games] = 0
+        self.done[games] = False
+        self.winner[games] = -1
+        self.plies[games] = 0
+        self.legal[games] = self.legal_masks(games)
+
+    def legal_masks(self, games=None, players=None):
+        """
+        Return the (len(games),) bitmask of tiles players (the player to move by
+        default) can reach in each game.
+        """
+        if games is None:
+            games = self.games
+        if players is None:
+            players = self.current[games]
+        players = np.broadcast_to(players, (len(games),))
+        origin = self.positions[games, players]
+        code = self.codes[games, origin]
+        collapsed = self.collapsed[games]
+        is_open = PATH_VALID[origin, code] & ((PATH_MASK[origin, code] & collapsed[:, None]) == 0)
+        masks = np.bitwise_or.reduce(np.where(is_open, TILE_BITS[PATH_DEST[origin, code]], 0), axis=1)
+        # Players cannot end on another active player's tile, and cannot move off a collapsed tile
+        for other in range(self.num_players):
+            others = players != other
+            masks[others] &= ~TILE_BITS[self.positions[games[others], other]]
+        masks[((collapsed >> origin) & 1) != 0] = 0
+        return masks
+
+    def step(self, actions, games=None):
+        """
+        Play actions[i] (a tile index) for the player to move in every unfinished game
+        (or only in the unfinished ones among games). Games whose next player is left
+        without a move are marked done, with the player who just moved as the winner.
+        Actions for the other games are ignored.
+        """
+        games = self.games if games is None else np.asarray(games)
+        games = games[~self.done[games]]
+        if not len(games):
+            return
+        actions = np.asarray(actions)[games]
+        players = self.current[games]
+        assert np.all((self.legal[games] >> actions) & 1), "illegal action"
+        self.collapsed[games] |= TILE_BITS[self.positions[games, players]]
+        self.positions[games, players] = actions
+        self.current[games] = (players + 1) % self.num_players
+        self.plies[games] += 1
+        self.legal[games] = self.legal_masks(games)
+        stuck = games[self.legal[games] == 0]
+        self.done[stuck] = True
+        self.winner[stuck] = players[self.legal[games] == 0]
+
+    def play(self, policies=None):
+        """
+        Play every game to the end. policies[p](batch, legal, rng) returns an (N,)
+        array of tiles for player index p, given the (N, TILE_COUNT) boolean legal
+        moves of the player to move. Random play by default. Returns the winners.
+        """
+        if policies is None:
+            policies = [random_policy] * self.num_players
+        while not self.done.all():
+            legal = mask_to_bool(self.legal)
+            actions = np.zeros(self.num_games, dtype=np.int64)
+            for player, policy in enumerate(policies):
+                turn = (self.current == player) & ~self.done
+                if turn.any():
+                    actions[turn] = policy(self, legal, self.rng)[turn]
+            self.step(actions)
+        return self.winner
+
+
+def simulate(num_games, policies=None, batch_size=4096, seed=None):
+    """Play num_games games in batches and return the winner index of each."""
+    rng = np.random.default_rng(seed)
+    winners = []
+    for start in range(0, num_games, batch_size):
+        batch = BatchGameState(min(batch_size, num_games - start), rng=rng)
+        winners.append(batch.play(policies))
+    return np.concatenate(winners)
@@ -0,0 +1,180 @@
+"""
+Compact bitboard representation of a GameState.
+
+Tiles are indexed row-major (tile = r * BOARD_SIZE + c).
+- collapsed: bitmask with bit `tile` set if that card has collapsed
+- values: packed integer, 4 bits per tile, holding CARD_TO_NUM of the card
+- positions: tile index of each player
+- hash: Zobrist hash of the above plus the turn, kept up to date by every move
+- sym_hash: the same hash for all 128 board symmetries, packed into one integer (see symmetry.py)
+"""
+
+from collapsi.configs.configs import *
+from collapsi.modules.card import Card
+from collapsi.modules.game import GameState
+from collapsi.modules.paths import *
+from collapsi.modules.symmetry import *
+from collapsi.modules.zobrist import *
+
+VALUE_BITS = 4
+VALUE_MASK = (1 << VALUE_BITS) - 1
+
+# Card value <-> packed numeric code
+CODE_TO_CARD = {code: card for card, code in CARD_TO_NUM.items()}
+JOKER_CODE = CARD_TO_NUM['Joker']
+DECK_CODES = [CARD_TO_NUM[card] for card in CARD_VALUES]  # the deck, as codes, in CARD_VALUES order
+
+# MOVE_PATHS re-indexed by packed code: CODE_PATHS[origin][code]
+CODE_PATHS = [
+    [paths.get(CODE_TO_CARD.get(code), ()) for code in range(max(CODE_TO_CARD) + 1)]
+    for paths in MOVE_PATHS
+]
+
+
+def pack_codes(codes):
+    """Pack the card codes of all tiles (codes[tile]) into a `values` integer."""
+    values = 0
+    for tile, code in enumerate(codes):
+        values |= int(code) << (VALUE_BITS * tile)
+    return values
+
+
+def deal(rng, num_players=NUMBER_OF_PLAYERS):
+    """
+    A fresh BitboardState shuffled like GameState.create_board, with rng (a
+    random.Random) shuffling the deck. The same rng state always gives the same deal.
+    """
+    codes = list(DECK_CODES)
+    rng.shuffle(codes)
+    return BitboardState.from_codes(codes, num_players)
+
+
+class BitboardState:
+    """
+    Drop-in replacement for GameState when searching.
+    Players are referred to by their index, so `make_move(state.current_player, move)`
+    works the same way on both classes.
+    """
+
+    def __init__(self, collapsed, values, positions, current_index=0, active=None, names=None):
+        self.collapsed = collapsed
+        self.values = values
+        self.positions = list(positions)
+        self.current_index = current_index
+        self.active = list(active) if active is not None else [True] * len(self.positions)
+        self.names = list(names) if names is not None else [f"P{i+1}" for i in range(len(self.positions))]
+        codes = [self.card_code(t) for t in range(TILE_COUNT)]
+        self.hash = zobrist_hash(collapsed, codes, self.positions, current_index)
+        self.sym_hash = packed_hash(collapsed, codes, self.positions, current_index)
+        self.history = []  # undo information for play, most recent last
+
+    @classmethod
+    def from_game_state(cls, game_state):
+        collapsed = 0
+        values = 0
+        for r in range(BOARD_SIZE):
+            for c in range(BOARD_SIZE):
+                tile = to_tile((r, c))
+                card = game_state.board[r][c]
+                if card.collapsed:
+                    collapsed |= 1 << tile
+                values |= CARD_TO_NUM[card.value] << (VALUE_BITS * tile)
+        return cls(collapsed,
+                   values,
+                   [to_tile(p.position) for p in game_state.players],
+                   game_state.current_index,
+                   [p.active for p in game_state.players],
+                   [p.name for p in game_state.players])
+
+    @classmethod
+    def from_codes(cls, codes, num_players=NUMBER_OF_PLAYERS):
+        """The start of a game on the board codes[tile]: nothing collapsed, first player to move."""
+        # Players start on the jokers, in row-major order (as in GameState.init_players)
+        jokers = [tile for tile, code in enumerate(codes) if code == JOKER_CODE]
+        return cls(0, pack_codes(codes), jokers[:num_players])
+
+    def to_game_state(self):
+        game_state = GameState(num_players=len(self.positions))
+        game_state.board = [[Card(self.card_value(to_tile((r, c))), self.is_collapsed(to_tile((r, c))))
+                             for c in range(BOARD_SIZE)] for r in range(BOARD_SIZE)]
+        for player, tile, active, name in zip(game_state.players, self.positions, self.active, self.names):
+            player.position = to_position(tile)
+            player.active = active
+            player.name = name
+            r, c = player.position
+            game_state.board[r][c].occupier = player
+        game_state.current_index = self.current_index
+        return game_state
+
+    def copy(self):
+        return BitboardState(self.collapsed, self.values, self.positions,
+                             self.current_index, self.active, self.names)
+
+    def card_code(self, tile):
+        return (self.values >> (VALUE_BITS * tile)) & VALUE_MASK
+
+    def card_value(self, tile):
+        return CODE_TO_CARD[self.card_code(tile)]
+
+    def is_collapsed(self, tile):
+        return bool(self.collapsed >> tile & 1)
+
+    @property
+    def current_player(self):
+        return self.current_index
+
+    @property
+    def is_terminal(self):
+        return not self.legal_mask(self.current_index)
+
+    def print_board(self):
+        self.to_game_state().print_board()
+
+    def legal_mask(self, player):
+        """Return a bitmask of the tiles the given player index can move to."""
+        origin = self.positions[player]
+        if self.collapsed >> origin & 1:
+            return 0
+
+        destinations = destinations_mask(CODE_PATHS[origin][self.card_code(origin)], self.collapsed)
+        for i, position in enumerate(self.positions):
+            if i != player and self.active[i]:
+                destinations &= ~(1 << position)
+        return destinations
+
+    def get_player_moves(self, player) -> list:
+        return [to_position(tile) for tile in iter_tiles(self.legal_mask(player))]
+
+    def get_current_player_moves(self) -> list:
+        return self.get_player_moves(self.current_index)
+
+    def play(self, player, tile):
+        """Move the given player index to tile, collapsing the tile it leaves."""
+        origin = self.positions[player]
+        self.history.append((player, origin, self.collapsed, self.current_index, self.hash, self.sym_hash))
+        if not self.collapsed >> origin & 1:
+            code = self.card_code(origin)
+            self.hash ^= Z_VALUE[origin][code]
+            self.sym_hash ^= PZ_VALUE[origin][code]
+        self.hash ^= Z_POSITION[player][origin] ^ Z_POSITION[player][tile]
+        self.sym_hash ^= PZ_POSITION[player][origin] ^ PZ_POSITION[player][tile]
+        self.collapsed |= 1 << origin
+        self.positions[player] = tile
+
+    def undo_move(self):
+        """Revert the most recent move, along with any next_player() called since."""
+        player, origin, self.collapsed, self.current_index, self.hash, self.sym_hash = self.history.pop()
+        self.positions[player] = origin
+
+    def make_move(self, player, destination):
+        self.play(player, to_tile(destination))
+
+    def next_player(self):
+        # rotate to next active player
+        previous_index = self.current_index
+        for _ in range(len(self.positions)):
+            self.current_index = (self.current_index + 1) % len(self.positions)
+            if self.active[self.current_index]:
+                break
+        self.hash ^= Z_TURN[previous_index] ^ Z_TURN[self.current_index]
+        self.sym_hash ^= PZ_TURN[previous_index] ^ PZ_TURN[self.current_index]
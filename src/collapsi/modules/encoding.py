@@ -0,0 +1,96 @@
+"""
+State and action encodings of the DQN, kept apart from the training code.
+
+Only NumPy is needed, so playing a trained model (inference.py, the play scripts)
+and running the environments do not depend on agent.py.
+"""
+
+import numpy as np
+from collapsi.configs.configs import *
+
+# --- Utility to encode the game state into a vector ---
+def encode_state(state, agent_name):
+    # Encode board: each tile = [card_value, collapsed_flag]
+    flat_board = []
+    for row in state.board:
+        for card in row:
+            # card_val = CARD_NUMERIC[card.value]
+            # collapsed = 1.0 if card.collapsed else 0.0
+            # flat_board.extend([card_val / 4.0, collapsed])  # Normalize card value
+            card_val = CARD_TO_NUM_NORMALIZED[card.value]
+            collapsed = 0.5 if card.collapsed else -0.5 # Centered around 0 for activation functions
+            flat_board.extend([card_val, collapsed])
+
+    # Encode player positions
+    agent_pos = None
+    enemy_pos = None
+    for p in state.players:
+        if p.name == agent_name:
+            agent_pos = p.position
+        else:
+            enemy_pos = p.position
+
+    # agent_vec = [agent_pos[0] / 4.0, agent_pos[1] / 4.0]
+    # enemy_vec = [enemy_pos[0] / 4.0, enemy_pos[1] / 4.0]
+
+    # Position: center from [0,4] --> [-0.5, 0.5]
+    agent_vec = [(agent_pos[0]-2) / 4.0, (agent_pos[1]-2) / 4.0]
+    enemy_vec = [(enemy_pos[0]-2) / 4.0, (enemy_pos[1]-2) / 4.0]
+
+    return np.array(flat_board + agent_vec + enemy_vec, dtype=np.float32) # 36 dimension
+
+# --- Batched state encoding ---
+# Same 36-dim layout as encode_state, written straight into a float32 array for many states at once:
+# [card_value, collapsed] per tile in row-major order, then agent (row, col), then enemy (row, col)
+STATE_DIM = 2 * BOARD_SIZE * BOARD_SIZE + 4
+TILE_INDEX = np.arange(BOARD_SIZE * BOARD_SIZE, dtype=np.int64)
+CODE_TO_NORMALIZED = np.zeros(max(CARD_TO_NUM.values()) + 1, dtype=np.float32)
+for _card, _code in CARD_TO_NUM.items():
+    CODE_TO_NORMALIZED[_code] = CARD_TO_NUM_NORMALIZED[_card]
+ROW_FEATURE = ((TILE_INDEX // BOARD_SIZE - 2) / 4.0).astype(np.float32)
+COL_FEATURE = ((TILE_INDEX % BOARD_SIZE - 2) / 4.0).astype(np.float32)
+
+def encode_arrays(codes, collapsed, agent_tiles, enemy_tiles, out=None):
+    """
+    Encode N states given as arrays:
+    codes: (N, 16) card codes (CARD_TO_NUM), collapsed: (N,) bitmask of collapsed tiles,
+    agent_tiles / enemy_tiles: (N,) tile index (row * 4 + col) of each player.
+    Writes into out (an (N, 36) float32 array, allocated if not given) and returns it.
+    """
+    n = len(codes)
+    if out is None:
+        out = np.empty((n, STATE_DIM), dtype=np.float32)
+    tiles = 2 * len(TILE_INDEX)
+    np.take(CODE_TO_NORMALIZED, codes, out=out[:, 0:tiles:2], mode='clip')
+    flags = out[:, 1:tiles:2]
+    np.bitwise_and(np.asarray(collapsed, dtype=np.int64)[:, None] >> TILE_INDEX, 1, out=flags, casting='unsafe')
+    flags -= 0.5  # Centered around 0 for activation functions
+    np.take(ROW_FEATURE, agent_tiles, out=out[:, tiles])
+    np.take(COL_FEATURE, agent_tiles, out=out[:, tiles + 1])
+    np.take(ROW_FEATURE, enemy_tiles, out=out[:, tiles + 2])
+    np.take(COL_FEATURE, enemy_tiles, out=out[:, tiles + 3])
+    return out
+
+def encode_bitboards(states, agent_indices, out=None):
+    """Encode a list of BitboardStates, each from the point of view of the matching player index."""
+    values = np.array([state.values for state in states], dtype=object)
+    codes = ((values[:, None] >> (4 * TILE_INDEX)) & 0xF).astype(np.int64)
+    collapsed = np.array([state.collapsed for state in states], dtype=np.int64)
+    agent_tiles = np.array([state.positions[i] for state, i in zip(states, agent_indices)], dtype=np.int64)
+    enemy_tiles = np.array([state.positions[1 - i] for state, i in zip(states, agent_indices)], dtype=np.int64)
+    return encode_arrays(codes, collapsed, agent_tiles, enemy_tiles, out)
+
+def encode_batch(batch, agent_index, out=None):
+    """Encode every game of a BatchGameState from the point of view of agent_index (scalar or (N,) array)."""
+    agent_index = np.broadcast_to(agent_index, (batch.num_games,))
+    return encode_arrays(batch.codes, batch.collapsed,
+                         batch.positions[batch.games, agent_index],
+                         batch.positions[batch.games, 1 - agent_index], out)
+
+# --- Utility to decode action index to (row, col) ---
+def decode_action(index):
+    return (index // 4, index % 4)
+
+# --- Utility to encode (row, col) to action index ---
+def encode_action(row, col):
+    return row * 4 + col
\ No newline at end of file
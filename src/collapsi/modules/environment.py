@@ -0,0 +1,95 @@
+"""
+Gym-style vectorized training environment.
+
+VecCollapsiEnv runs N games at once on a BatchGameState, seen from the agent's
+side: every call to step() plays one agent move in every game, lets the
+opponent policy reply, and returns arrays for all games at once. The reward
+shaping is the one train.py has always used (AGENT_REWARDS):
+- WIN when the opponent is left without a move
+- LOSS when the agent is left without a move after the opponent's reply
+- SURVIVE_ANOTHER_ROUND otherwise, scaled up by how many moves the opponent lost
+  since its previous turn
+Finished games are dealt again straight away (auto-reset), so every game in the
+batch always waits for an agent move.
+
+This is not quite the MDP of the single-game loop train.py used before, so its
+hyperparameters and win rates do not carry over as they are:
+- a transition's next state is the agent's next decision point, after the
+  opponent's reply (info["final_observation"] for finished games), where the old
+  loop used the position right after the agent's own move
+- a lost game gives one LOSS transition for the agent's last move, where the old
+  loop first remembered it as a survive transition and then again as a LOSS
+- the agent trains on DQN_NUM_ENVS interleaved games, and the schedule counts
+  transitions across all of them (DQNAgent.learn), not turns of one game
+The observation, reward and done flag of every other transition are unchanged;
+tests/test_environment.py replays the old loop against step().
+"""
+
+import numpy as np
+from collapsi.configs.configs import *
+from collapsi.modules.batch_game import *
+from collapsi.modules.encoding import encode_batch
+
+class VecCollapsiEnv():
+    def __init__(self, num_envs, opponent=random_policy, agent_index=0, rng=None):
+        """
+        opponent(batch, legal, rng) picks the opponent's tiles, like the policies of
+        BatchGameState.play. agent_index is the agent's seat: 0 moves first.
+        """
+        self.num_envs = num_envs
+        self.opponent = opponent
+        self.agent_index = agent_index
+        self.opponent_index = 1 - agent_index
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.batch = BatchGameState(num_envs, num_players=2, rng=self.rng)
+        self.enemy_moves = np.zeros(num_envs, dtype=np.int64)  # opponent's move count on its previous turn
+
+    def observe(self):
+        """Return (observations, legal): the (N, 36) encoded states and (N, 16) legal agent moves."""
+        return encode_batch(self.batch, self.agent_index), mask_to_bool(self.batch.legal)
+
+    def reset(self, games=None):
+        """Deal new boards for the given games (all of them by default) and return observe()."""
+        batch = self.batch
+        games = batch.games if games is None else games
+        while len(games):
+            batch.reset(games)
+            self.enemy_moves[games] = mask_to_bool(batch.legal_masks(games, self.opponent_index)).sum(axis=1)
+            if self.agent_index != 0:
+                self.opponent_move()
+            # Deal again in the rare case the agent is stuck before its first move
+            games = games[batch.done[games]]
+        return self.observe()
+
+    def opponent_move(self):
+        """Play the opponent's move in every unfinished game where it is the opponent's turn."""
+        batch = self.batch
+        turn = ~batch.done & (batch.current == self.opponent_index)
+        actions = np.zeros(self.num_envs, dtype=np.int64)
+        actions[turn] = self.opponent(batch, mask_to_bool(batch.legal), self.rng)[turn]
+        batch.step(actions, batch.games[turn])
+
+    def step(self, actions):
+        """
+        Play the agent's tile actions[i] in every game, then the opponent's reply.
+        Returns (observations, legal, rewards, dones, info). Games that ended are
+        already reset in observations and legal; info["final_observation"] holds
+        the state each game reached before that reset (the next state of the
+        transition) and info["winner"] the winning seat of finished games (-1 otherwise).
+        """
+        batch = self.batch
+        batch.step(actions)
+        rewards = np.full(self.num_envs, AGENT_REWARDS['WIN'], dtype=np.float32)
+
+        ongoing = ~batch.done
+        enemy_moves = mask_to_bool(batch.legal).sum(axis=1)
+        scale = np.where(enemy_moves < self.enemy_moves, 1 + self.enemy_moves - enemy_moves, 1)
+        self.opponent_move()
+        rewards[ongoing] = scale[ongoing] * AGENT_REWARDS['SURVIVE_ANOTHER_ROUND']
+        rewards[ongoing & batch.done] = AGENT_REWARDS['LOSS']
+        self.enemy_moves[ongoing] = enemy_moves[ongoing]
+
+        dones = batch.done.copy()
+        info = {"final_observation": encode_batch(batch, self.agent_index), "winner": batch.winner.copy()}
+        observations, legal = self.reset(batch.games[dones])
+        return observations, legal, rewards, dones, info
@@ -2,6 +2,7 @@ import random
 from copy import deepcopy
 from collapsi.configs.configs import *
 from collapsi.modules.card import Card
+from collapsi.modules.paths import *
 from collapsi.modules.player import Player
 from collapsi.utilities.vprint import vprint
 
@@ -11,6 +12,7 @@ class GameState:
         self.board = self.create_board()
         self.players = self.init_players(num_players)
         self.current_index = 0  # whose turn it is
+        self.history = []  # undo information for make_move, most recent last
     
     @property
     def current_player(self):
@@ -63,37 +65,40 @@ class GameState:
         if card.collapsed:
             return []
 
-        steps_options = CARD_NUMERIC[card.value]
-        if not isinstance(steps_options, list):
-            steps_options = [steps_options]
+        collapsed = 0
+        for tile in range(TILE_COUNT):
+            tr, tc = to_position(tile)
+            if self.board[tr][tc].collapsed:
+                collapsed |= 1 << tile
 
-        other_positions = {p.position for p in self.players if p != player and p.active}
-        moves = set()
+        # Destinations whose precomputed path masks avoid every collapsed tile
+        reachable = destinations_mask(MOVE_PATHS[to_tile((r, c))][card.value], collapsed)
+        for p in self.players:
+            if p != player and p.active:
+                reachable &= ~(1 << to_tile(p.position))
 
-        def dfs(path, steps_remaining):
-            if steps_remaining == 0:
-                final = path[-1]
-                if final != (r, c) and final not in other_positions:
-                    moves.add(final)
-                return
-            for dr, dc in DIRECTIONS:
-                nr, nc = (path[-1][0] + dr) % BOARD_SIZE, (path[-1][1] + dc) % BOARD_SIZE
-                if self.board[nr][nc].collapsed or (nr, nc) in path:
-                    continue
-                dfs(path + [(nr, nc)], steps_remaining - 1)
-
-        for steps in steps_options:
-            dfs([(r, c)], steps)
-
-        return list(moves)
+        return [to_position(tile) for tile in iter_tiles(reachable)]
 
     def make_move(self, player, destination):
         r, c = player.position
+        dr, dc = destination
+        self.history.append((player, player.position, self.board[r][c].collapsed,
+                             self.board[dr][dc].occupier, self.current_index))
         self.board[r][c].collapsed = True
         player.position = destination
         r, c = player.position
         self.board[r][c].occupier = player
 
+    def undo_move(self):
+        """Revert the most recent make_move, along with any next_player() called since."""
+        player, origin, collapsed, occupier, current_index = self.history.pop()
+        r, c = player.position
+        self.board[r][c].occupier = occupier
+        player.position = origin
+        r, c = origin
+        self.board[r][c].collapsed = collapsed
+        self.current_index = current_index
+
     def next_player(self):
         # rotate to next active player
         for _ in range(len(self.players)):
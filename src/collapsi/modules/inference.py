@@ -0,0 +1,61 @@
+"""
+Frozen DQN for playing, without the training machinery.
+
+export_model turns a trained DQN into a TorchScript file (optionally with its
+linear layers dynamically quantized to int8), and load_policy loads such a file,
+or a plain state dict as saved by train.py, into an InferencePolicy: just the
+network and a masked greedy move picker. No optimizer, target network or replay
+buffer is created, which is all the play scripts and evaluations need.
+"""
+
+import copy
+import os
+import numpy as np
+import torch
+import torch.nn as nn
+from collapsi.configs.configs import *
+
+def export_model(model, path=DQN_INFERENCE_MODEL_NAME, quantize=DQN_QUANTIZE_INFERENCE):
+    """Save a frozen TorchScript copy of model (a DQN) to path, int8-quantized if asked. Returns the exported module."""
+    model = copy.deepcopy(model).eval()  # leave the training model untouched
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    scripted = torch.jit.freeze(torch.jit.script(model))
+    scripted.save(path)
+    return scripted
+
+class InferencePolicy():
+    def __init__(self, model):
+        self.model = model
+
+    def select_actions(self, states, legal_masks):
+        """Best legal action for each of the (N, state_dim) states, given (N, action_dim) boolean legal masks."""
+        with torch.inference_mode():
+            q_vals = self.model(torch.as_tensor(states, dtype=torch.float32))
+            return q_vals.masked_fill(~torch.as_tensor(legal_masks), float('-inf')).argmax(1).numpy()
+
+    def select_move(self, state_vec, legal_moves):
+        """Best (row, col) among legal_moves for a single encoded state."""
+        legal_mask = np.zeros((1, BOARD_SIZE * BOARD_SIZE), dtype=bool)
+        for r, c in legal_moves:
+            legal_mask[0, r * BOARD_SIZE + c] = True
+        action = int(self.select_actions(np.asarray(state_vec)[None], legal_mask)[0])
+        return (action // BOARD_SIZE, action % BOARD_SIZE)
+
+def load_policy(path=None, state_dim=36, action_dim=16):
+    """
+    Load an exported TorchScript model, or a DQN state dict (.pth), for playing.
+    By default the export train.py writes (DQN_INFERENCE_MODEL_NAME) is loaded, or
+    the state dict (DQN_MODEL_NAME) of models trained before there was one.
+    """
+    if path is None:
+        path = DQN_INFERENCE_MODEL_NAME if os.path.exists(DQN_INFERENCE_MODEL_NAME) else DQN_MODEL_NAME
+    try:
+        model = torch.jit.load(path)
+    except RuntimeError:
+        # Not TorchScript: a state dict from torch.save(agent.model.state_dict(), ...)
+        from collapsi.modules.agent import DQN
+        model = DQN(state_dim, action_dim)
+        model.load_state_dict(torch.load(path))
+    model.eval()
+    return InferencePolicy(model)
@@ -0,0 +1,142 @@
+"""
+Precomputed movement paths on the wrapping board.
+
+A move of n steps follows a simple path (no tile visited twice, origin included)
+of orthogonal steps. These paths only depend on the origin tile and the step
+count, so they are computed once at import time. Each path is stored as its
+destination together with a bitmask of the tiles it passes through (destination
+included, origin excluded). A path is legal when its mask does not intersect the
+collapsed mask.
+"""
+
+from collapsi.configs.configs import *
+
+TILE_COUNT = BOARD_SIZE * BOARD_SIZE
+MAX_STEPS = max(max(s) if isinstance(s, list) else s for s in CARD_NUMERIC.values())
+
+
+def to_tile(position):
+    r, c = position
+    return r * BOARD_SIZE + c
+
+
+def to_position(tile):
+    return (tile // BOARD_SIZE, tile % BOARD_SIZE)
+
+
+def iter_tiles(mask):
+    """Yield the tile indices of the set bits of mask, in ascending order."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# Orthogonal neighbours of every tile on the wrapping board
+NEIGHBORS = [
+    tuple(to_tile(((r + dr) % BOARD_SIZE, (c + dc) % BOARD_SIZE)) for dr, dc in DIRECTIONS)
+    for r in range(BOARD_SIZE) for c in range(BOARD_SIZE)
+]
+
+ALL_TILES = (1 << TILE_COUNT) - 1
+_FIRST_COLUMN = sum(1 << (r * BOARD_SIZE) for r in range(BOARD_SIZE))
+_LAST_COLUMN = _FIRST_COLUMN << (BOARD_SIZE - 1)
+
+
+def flood_fill(open_mask, tile, stop_mask=0):
+    """
+    Return the bitmask of the tiles connected to tile (included) by orthogonal steps
+    through open_mask. Stops early, with part of the region, once it reaches stop_mask.
+    """
+    region = 1 << tile
+    while not region & stop_mask:
+        # Add the neighbours of every tile (wrapping around), bit-parallel
+        grown = (region
+                 | (region << 1 & ~_FIRST_COLUMN) | (region >> (BOARD_SIZE - 1) & _FIRST_COLUMN)
+                 | (region >> 1 & ~_LAST_COLUMN) | (region << (BOARD_SIZE - 1) & _LAST_COLUMN)
+                 | region << BOARD_SIZE | region >> (TILE_COUNT - BOARD_SIZE)
+                 | region >> BOARD_SIZE | region << (TILE_COUNT - BOARD_SIZE)) & open_mask | region
+        if grown == region:
+            break
+        region = grown
+    return region
+
+
+_COMPONENTS = {}
+
+
+def components(open_mask):
+    """
+    Split open_mask into its connected regions (see flood_fill). Cached, as there
+    are at most 2 ** TILE_COUNT masks and the solver asks for the same ones often.
+    """
+    regions = _COMPONENTS.get(open_mask)
+    if regions is None:
+        regions = []
+        rest = open_mask
+        while rest:
+            region = flood_fill(open_mask, (rest & -rest).bit_length() - 1)
+            regions.append(region)
+            rest &= ~region
+        regions = _COMPONENTS[open_mask] = tuple(regions)
+    return regions
+
+
+def _build_paths(origin, steps):
+    """Return the set of (destination, mask) for every simple path of `steps` steps from origin."""
+    frontier = [(origin, 1 << origin)]
+    for _ in range(steps):
+        frontier = [(n, visited | (1 << n)) for tile, visited in frontier
+                    for n in NEIGHBORS[tile] if not visited >> n & 1]
+    return {(tile, visited & ~(1 << origin)) for tile, visited in frontier}
+
+
+def _group_by_destination(paths):
+    """
+    Group (destination, mask) pairs into (destination_bit, masks) entries.
+    A mask that contains another mask to the same destination can never be the
+    only open path, so it is dropped.
+    """
+    by_destination = {}
+    for destination, mask in paths:
+        by_destination.setdefault(destination, set()).add(mask)
+    grouped = []
+    for destination in sorted(by_destination):
+        masks = sorted(by_destination[destination], key=lambda m: (bin(m).count("1"), m))
+        minimal = []
+        for mask in masks:
+            if not any(kept & mask == kept for kept in minimal):
+                minimal.append(mask)
+        grouped.append((1 << destination, tuple(minimal)))
+    return tuple(grouped)
+
+
+# PATHS[origin][steps] -> tuple of (destination, mask)
+PATHS = [
+    [tuple(sorted(_build_paths(origin, steps))) for steps in range(MAX_STEPS + 1)]
+    for origin in range(TILE_COUNT)
+]
+
+# MOVE_PATHS[origin][card_value] -> tuple of (destination_bit, masks), covering every
+# step count the card allows (all of 1-4 for a Joker)
+MOVE_PATHS = []
+for _origin in range(TILE_COUNT):
+    _by_card = {}
+    for _card, _steps in CARD_NUMERIC.items():
+        _steps = _steps if isinstance(_steps, list) else [_steps]
+        _paths = set()
+        for _n in _steps:
+            _paths |= set(PATHS[_origin][_n])
+        _by_card[_card] = _group_by_destination(_paths)
+    MOVE_PATHS.append(_by_card)
+
+
+def destinations_mask(move_paths, collapsed):
+    """Return the bitmask of destinations reachable through at least one open path."""
+    reachable = 0
+    for destination_bit, masks in move_paths:
+        for mask in masks:
+            if not mask & collapsed:
+                reachable |= destination_bit
+                break
+    return reachable
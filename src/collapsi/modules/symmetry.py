@@ -0,0 +1,80 @@
+"""
+Symmetries of the wrapping board.
+
+Every translation of the torus, combined with any of the 8 rotations/reflections
+of the square, maps legal moves onto legal moves, so positions related by one of
+these 128 transforms have the same outcome.
+
+To find a canonical representative cheaply, BitboardState keeps a "packed"
+symmetric hash: one big integer holding, in lane g (bits 64g to 64g+63), the
+Zobrist hash of the state transformed by SYMMETRIES[g]. A move updates every
+lane with a single XOR, and the canonical key is the smallest lane.
+"""
+
+import sys
+from collapsi.configs.configs import *
+from collapsi.modules.paths import TILE_COUNT, to_tile, iter_tiles
+from collapsi.modules.zobrist import *
+
+
+def _transform(swap, flip_r, flip_c, shift_r, shift_c):
+    perm = []
+    for tile in range(TILE_COUNT):
+        r, c = tile // BOARD_SIZE, tile % BOARD_SIZE
+        if swap:
+            r, c = c, r
+        if flip_r:
+            r = -r
+        if flip_c:
+            c = -c
+        perm.append(to_tile(((r + shift_r) % BOARD_SIZE, (c + shift_c) % BOARD_SIZE)))
+    return tuple(perm)
+
+
+# SYMMETRIES[g][tile] -> tile that `tile` is mapped to. SYMMETRIES[0] is the identity.
+SYMMETRIES = [
+    _transform(swap, flip_r, flip_c, shift_r, shift_c)
+    for swap in (False, True) for flip_r in (False, True) for flip_c in (False, True)
+    for shift_r in range(BOARD_SIZE) for shift_c in range(BOARD_SIZE)
+]
+SYMMETRY_COUNT = len(SYMMETRIES)
+INVERSE_SYMMETRIES = [tuple(perm.index(tile) for tile in range(TILE_COUNT)) for perm in SYMMETRIES]
+
+LANE_BITS = 64
+LANE_MASK = (1 << LANE_BITS) - 1
+PACKED_BYTES = SYMMETRY_COUNT * LANE_BITS // 8
+
+
+def _pack(lanes):
+    packed = 0
+    for g, lane in enumerate(lanes):
+        packed |= lane << (LANE_BITS * g)
+    return packed
+
+
+# Packed counterparts of the Zobrist tables: lane g holds the key of the transformed tile
+PZ_VALUE = [[_pack(Z_VALUE[perm[tile]][code] for perm in SYMMETRIES) for code in range(VALUE_CODES)]
+            for tile in range(TILE_COUNT)]
+PZ_POSITION = [[_pack(Z_POSITION[player][perm[tile]] for perm in SYMMETRIES) for tile in range(TILE_COUNT)]
+               for player in range(NUMBER_OF_PLAYERS)]
+PZ_TURN = [_pack([key] * SYMMETRY_COUNT) for key in Z_TURN]
+
+
+def packed_hash(collapsed, codes, positions, current_index):
+    """Compute a packed symmetric hash from scratch. codes[tile] is the packed card code of each tile."""
+    h = PZ_TURN[current_index]
+    for tile in iter_tiles(~collapsed & ((1 << TILE_COUNT) - 1)):
+        h ^= PZ_VALUE[tile][codes[tile]]
+    for player, tile in enumerate(positions):
+        h ^= PZ_POSITION[player][tile]
+    return h
+
+
+def canonical_hash(packed):
+    """
+    Return (key, g): the smallest lane of a packed hash and the index of the
+    symmetry that produced it, i.e. the one mapping the state onto its representative.
+    """
+    lanes = memoryview(packed.to_bytes(PACKED_BYTES, sys.byteorder)).cast("Q").tolist()
+    key = min(lanes)
+    return key, lanes.index(key)
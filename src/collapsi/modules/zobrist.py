@@ -0,0 +1,30 @@
+"""
+Zobrist hashing keys for BitboardState.
+
+A state's hash is the XOR of:
+- Z_VALUE[tile][code] for every tile that has not collapsed (collapsed tiles contribute nothing)
+- Z_POSITION[player][tile] for every player
+- Z_TURN[current_index]
+so each move only touches a handful of keys and the hash can be updated incrementally.
+"""
+
+import random
+from collapsi.configs.configs import *
+from collapsi.modules.paths import TILE_COUNT, iter_tiles
+
+VALUE_CODES = max(CARD_TO_NUM.values()) + 1
+
+_rng = random.Random(ZOBRIST_SEED)
+Z_VALUE = [[_rng.getrandbits(64) for _ in range(VALUE_CODES)] for _ in range(TILE_COUNT)]
+Z_POSITION = [[_rng.getrandbits(64) for _ in range(TILE_COUNT)] for _ in range(NUMBER_OF_PLAYERS)]
+Z_TURN = [_rng.getrandbits(64) for _ in range(NUMBER_OF_PLAYERS)]
+
+
+def zobrist_hash(collapsed, codes, positions, current_index):
+    """Compute a hash from scratch. codes[tile] is the packed card code of each tile."""
+    h = Z_TURN[current_index]
+    for tile in iter_tiles(~collapsed & ((1 << TILE_COUNT) - 1)):
+        h ^= Z_VALUE[tile][codes[tile]]
+    for player, tile in enumerate(positions):
+        h ^= Z_POSITION[player][tile]
+    return h
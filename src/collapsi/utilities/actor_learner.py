@@ -0,0 +1,181 @@
+"""
+Multi-process DQN training on one machine.
+
+train_dqn_agent in train.py plays a game, remembers and trains in one loop. Here
+the two halves run side by side:
+- actors (one process each) play the same games as train_dqn_agent (the agent as
+  P1 against a random P2 in a VecCollapsiEnv) with a local copy of the DQN
+  weights, and write every transition into their own TransitionRing, a ring
+  buffer in shared memory
+- the learner (the calling process) drains the rings into the agent's replay
+  buffer, trains, and every sync_interval updates publishes its weights to a
+  shared array that the actors reload before their next move
+"""
+
+import multiprocessing
+import random
+import time
+import numpy as np
+import torch
+from torch.nn.utils import parameters_to_vector, vector_to_parameters
+from collapsi.configs.configs import *
+from collapsi.modules.agent import *
+from collapsi.modules.environment import VecCollapsiEnv
+from collapsi.utilities.vprint import vprint
+
+class TransitionRing():
+    """
+    Single-producer / single-consumer ring of transitions in shared memory.
+    Each row is [state, action, reward, next_state, done, next_legal] as float32. The writer
+    only advances `written` once a row is complete and the reader only advances
+    `read`, so neither needs a lock.
+    """
+
+    def __init__(self, capacity, state_dim=STATE_DIM, action_dim=16, context=multiprocessing):
+        self.capacity = capacity
+        self.state_dim = state_dim
+        self.width = 2 * state_dim + 3 + action_dim
+        self.raw = context.RawArray('f', capacity * self.width)
+        self.written = context.RawValue('q', 0)
+        self.read = context.RawValue('q', 0)
+        self._make_view()
+
+    def _make_view(self):
+        self.rows = np.frombuffer(self.raw, dtype=np.float32).reshape(self.capacity, self.width)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['rows']  # rebuilt on the shared buffer in the child
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._make_view()
+
+    def put(self, state, action, reward, next_state, done, next_legal, stop_event):
+        """Append a transition, waiting while the ring is full. Returns False if stop_event was set meanwhile."""
+        while self.written.value - self.read.value >= self.capacity:
+            if stop_event.is_set():
+                return False
+            time.sleep(0.001)
+        d = self.state_dim
+        row = self.rows[self.written.value % self.capacity]
+        row[:d] = state
+        row[d] = action
+        row[d + 1] = reward
+        row[d + 2:2 * d + 2] = next_state
+        row[2 * d + 2] = done
+        row[2 * d + 3:] = next_legal
+        self.written.value += 1
+        return True
+
+    def take(self):
+        """Remove and return every complete transition as (states, actions, rewards, next_states, dones, next_legal) arrays."""
+        start, end = self.read.value, self.written.value
+        indices = np.arange(start, end) % self.capacity
+        rows = self.rows[indices]  # fancy indexing copies, so the slots can be reused right away
+        self.read.value = end
+        d = self.state_dim
+        return (rows[:, :d], rows[:, d].astype(np.int64), rows[:, d + 1],
+                rows[:, d + 2:2 * d + 2], rows[:, 2 * d + 2], rows[:, 2 * d + 3:] != 0)
+
+def run_actor(ring, weights, version, weights_lock, stop_event, seed, state_dim=STATE_DIM, action_dim=16,
+              num_envs=DQN_NUM_ENVS):
+    """Actor process: play num_envs games at a time with the latest published weights until stop_event is set."""
+    torch.set_num_threads(1)  # one core per actor
+    env = VecCollapsiEnv(num_envs, rng=np.random.default_rng(seed))
+    model = DQN(state_dim, action_dim)
+    model.eval()
+    shared = torch.from_numpy(np.frombuffer(weights, dtype=np.float32))
+    loaded = -1
+
+    states, legal = env.reset()
+    while not stop_event.is_set():
+        if version.value != loaded:
+            with weights_lock:
+                vector_to_parameters(shared.clone(), model.parameters())
+                loaded = version.value
+        with torch.no_grad():
+            q_vals = model(torch.from_numpy(states))
+        actions = q_vals.masked_fill(~torch.from_numpy(legal), float('-inf')).argmax(1).numpy()
+        next_states, legal, rewards, dones, info = env.step(actions)
+        for i in range(num_envs):
+            if not ring.put(states[i], actions[i], rewards[i], info["final_observation"][i], dones[i], legal[i], stop_event):
+                return
+        states = next_states
+
+def train_distributed(agent, episodes=1000, actors=DQN_ACTORS, sync_interval=DQN_ACTOR_SYNC_INTERVAL,
+                      ring_size=DQN_ACTOR_RING_SIZE, seed=None, checkpoint_every=DQN_CHECKPOINT_EVERY,
+                      progress=None):
+    """
+    Train agent with `actors` actor processes feeding the learner (this process).
+    Like train_dqn_agent, the learner trains on the agent's schedule (DQNAgent.learn),
+    checkpoints every checkpoint_every games and at the end, and returns the running
+    win count after each of the first `episodes` finished games.
+    progress (from DQNAgent.load_checkpoint) carries on a run's counts and seed. The
+    actors then start new games, so games and transitions that were in flight are lost.
+    """
+    context = multiprocessing.get_context("spawn")
+    state_dim = agent.model.net[0].in_features
+    if progress is not None:
+        seed, wins, win_counter = progress["seed"], progress["wins"], progress["win_counter"]
+    else:
+        seed = seed if seed is not None else random.randrange(2 ** 32)
+        wins, win_counter = 0, []
+    resumed_at = len(win_counter)  # keeps a resumed run from replaying the same games
+
+    rings = [TransitionRing(ring_size, state_dim, agent.action_dim, context) for _ in range(actors)]
+    initial = parameters_to_vector(agent.model.parameters()).detach().numpy()
+    weights = context.RawArray('f', len(initial))
+    shared = np.frombuffer(weights, dtype=np.float32)
+    shared[:] = initial
+    version = context.RawValue('q', 0)
+    weights_lock = context.Lock()
+    stop_event = context.Event()
+
+    processes = [context.Process(target=run_actor,
+                                 args=(ring, weights, version, weights_lock, stop_event, (seed, resumed_at, i),
+                                       state_dim, agent.action_dim),
+                                 daemon=True)
+                 for i, ring in enumerate(rings)]
+    for process in processes:
+        process.start()
+
+    published = 0  # agent.steps // sync_interval when the weights were last published
+    try:
+        while len(win_counter) < episodes:
+            received = 0
+            for ring in rings:
+                states, actions, rewards, next_states, dones, next_legal = ring.take()
+                received += len(actions)
+                for i in range(len(actions)):
+                    if len(win_counter) >= episodes:
+                        break
+                    agent.remember(states[i], actions[i], rewards[i], next_states[i], bool(dones[i]), next_legal[i])
+                    agent.learn()
+                    if agent.steps // sync_interval != published:
+                        published = agent.steps // sync_interval
+                        with weights_lock:
+                            shared[:] = parameters_to_vector(agent.model.parameters()).detach().numpy()
+                            version.value += 1
+                    if dones[i]:
+                        if rewards[i] == AGENT_REWARDS['WIN']:
+                            wins += 1
+                        win_counter.append(wins)
+                        vprint(f"Game over. Winner: {'P1' if rewards[i] == AGENT_REWARDS['WIN'] else 'P2'}")
+                        episode = len(win_counter)
+                        if episode % 1000 == 0:
+                            print(f"Episode {episode}: Win rate = {wins/episode}, Epsilon = {agent.epsilon:.3f}")
+                        if checkpoint_every and episode % checkpoint_every == 0:
+                            agent.save_checkpoint(progress={"seed": seed, "wins": wins, "win_counter": win_counter})
+            if not received:
+                time.sleep(0.001)
+    finally:
+        stop_event.set()
+        for process in processes:
+            process.join()
+
+    if checkpoint_every is not None:
+        agent.save_checkpoint(progress={"seed": seed, "wins": wins, "win_counter": win_counter})
+    print(f"Final win rate: {wins}/{episodes}")
+    return win_counter
@@ -0,0 +1,107 @@
+"""
+Proof-number search backend for the Solver.
+
+Collapsi positions are either won or lost for the player to move, which is
+exactly what proof-number search is built for. Every node of the search tree
+carries two numbers, from the point of view of the player to move there:
+- pn: how many leaves still have to be solved to prove a win
+- dn: how many leaves still have to be solved to prove a loss
+A win needs one child that loses (pn = min of the children's dn), a loss needs
+every child to win (dn = sum of the children's pn). The search keeps expanding
+the leaf that is cheapest to settle the root with, so short forced wins are
+found without first exhausting long losing lines.
+"""
+
+from collapsi.configs.configs import *
+from collapsi.modules.bitboard import *
+from collapsi.utilities.solver import *
+from collapsi.utilities.solver import _count_bits
+
+INFINITY = 10 ** 9
+
+class PNNode():
+    __slots__ = ("tile", "pn", "dn", "children")
+
+    def __init__(self, tile, pn, dn):
+        self.tile = tile  # move that led here from the parent
+        self.pn = pn
+        self.dn = dn
+        self.children = None
+
+class ProofNumberSolver(Solver):
+    """
+    Drop-in alternative to Solver: same constructor, best_moves and memo format,
+    so both can share a TranspositionTable. Proven positions are written to the
+    memo and memo entries are used as already-proven leaves.
+    nodes counts the positions expanded.
+    """
+
+    def evaluate(self, game_state):
+        """Return a fresh node for the position, using the memo when it is already solved."""
+        key, g = self.canonical(game_state)
+        result = self.memoized_states.get(key)
+        if result is not None:
+            return PNNode(None, 0, INFINITY) if result != LOSS else PNNode(None, INFINITY, 0)
+        if self.decompose:
+            wins = self.memoize_separated(game_state, key, g)
+            if wins is not None:
+                return PNNode(None, 0, INFINITY) if wins else PNNode(None, INFINITY, 0)
+        moves = _count_bits(game_state.legal_mask(game_state.current_index))
+        if not moves:
+            self.memoized_states[key] = LOSS
+            return PNNode(None, INFINITY, 0)
+        return PNNode(None, 1, moves)
+
+    def expand(self, node, game_state):
+        self.nodes += 1
+        node.children = []
+        for tile in iter_tiles(game_state.legal_mask(game_state.current_index)):
+            game_state.play(game_state.current_index, tile)
+            game_state.next_player()
+            child = self.evaluate(game_state)
+            game_state.undo_move()
+            child.tile = tile
+            node.children.append(child)
+        self.update(node, game_state)
+
+    def update(self, node, game_state):
+        """Recompute a node's numbers from its children, storing it in the memo once proven."""
+        node.pn = min(child.dn for child in node.children)
+        node.dn = min(sum(child.pn for child in node.children), INFINITY)
+        if node.pn == 0 or node.dn == 0:
+            key, g = self.canonical(game_state)
+            if node.pn == 0:
+                tile = next(child.tile for child in node.children if child.dn == 0)
+                self.memoized_states[key] = SYMMETRIES[g][tile]
+            else:
+                self.memoized_states[key] = LOSS
+            node.children = None  # the subtree is no longer needed
+
+    def solve_root(self, game_state):
+        root = self.evaluate(game_state)
+        path = [root]  # nodes from the root to where the next descent starts; game_state follows it
+        while root.pn and root.dn:
+            if self.stop_event is not None and not self.nodes % self.stop_check_interval and self.stop_event.is_set():
+                raise SearchAborted
+            # Walk down to the most-proving leaf, playing the moves as we go
+            node = path[-1]
+            while node.children is not None:
+                node = min(node.children, key=lambda child: child.dn)
+                game_state.play(game_state.current_index, node.tile)
+                game_state.next_player()
+                path.append(node)
+            self.expand(node, game_state)
+            # Back up the new numbers, taking the moves back. Once an ancestor's numbers
+            # do not change, the most-proving leaf is still below it: resume from there.
+            while len(path) > 1:
+                path.pop()
+                game_state.undo_move()
+                parent = path[-1]
+                before = (parent.pn, parent.dn)
+                self.update(parent, game_state)
+                if (parent.pn, parent.dn) == before:
+                    break
+        return root.pn == 0
+
+    def solve(self, game_state):
+        return self.solve_root(game_state)
@@ -0,0 +1,65 @@
+import threading
+import time
+from collapsi.configs.configs import *
+from collapsi.modules.bitboard import *
+from collapsi.utilities.solver import Solver, SearchAborted
+
+class _YieldingEvent():
+    """Wraps a threading.Event so that every stop check also gives other threads a turn."""
+
+    def __init__(self, event):
+        self.event = event
+
+    def is_set(self):
+        time.sleep(PONDER_YIELD_SECONDS)
+        return self.event.is_set()
+
+class Ponderer():
+    """
+    Thinks on the opponent's time.
+
+    While the human decides, a background thread solves the bot's reply to every
+    legal human move, filling the shared memo. Once the human commits a move the
+    pondering is stopped and the bot's own search mostly hits the memo.
+    The thread sleeps briefly every PONDER_CHECK_INTERVAL nodes, so it never holds
+    the GIL long enough to stall the UI thread.
+    """
+
+    def __init__(self, memo):
+        self.memo = memo
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.solved = 0  # human moves whose bot reply has been fully solved
+
+    def start(self, game_state):
+        """Start pondering the human's moves from game_state (a GameState or BitboardState)."""
+        self.stop()
+        if not isinstance(game_state, BitboardState):
+            game_state = BitboardState.from_game_state(game_state)
+        self.stop_event = threading.Event()
+        self.solved = 0
+        self.thread = threading.Thread(target=self.run, args=(game_state.copy(), self.stop_event), daemon=True)
+        self.thread.start()
+
+    def run(self, game_state, stop_event):
+        for tile in iter_tiles(game_state.legal_mask(game_state.current_index)):
+            if stop_event.is_set():
+                return
+            reply = game_state.copy()
+            reply.play(reply.current_index, tile)
+            reply.next_player()
+            solver = Solver(reply, memo=self.memo)
+            solver.stop_event = _YieldingEvent(stop_event)
+            solver.stop_check_interval = PONDER_CHECK_INTERVAL
+            try:
+                solver.best_moves(reply, workers=1)
+            except SearchAborted:
+                return
+            self.solved += 1
+
+    def stop(self):
+        """Cancel pondering and wait for the thread to finish, so the memo is no longer being written."""
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
@@ -1,53 +1,472 @@
-from copy import deepcopy
+import itertools
+import multiprocessing
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
 from collapsi.configs.configs import *
-from collapsi.modules.agent import *
+from collapsi.modules.bitboard import *
 from collapsi.modules.game import *
+from collapsi.utilities.transposition import TranspositionTable
 from collapsi.utilities.vprint import vprint
 
+# Memo entries: the tile index of a winning move, or LOSS if the player to move loses
+LOSS = -1
+
+# Default number of nodes searched between checks of a solver's stop_event and deadline
+STOP_CHECK_INTERVAL = 4096
+
+# Scores of the depth-limited search, from the point of view of the player to move.
+# Anything strictly between -WIN_SCORE and WIN_SCORE is a heuristic estimate.
+WIN_SCORE = 1000
+
+class SearchAborted(Exception):
+    """Raised inside a search when its stop_event is set or its deadline has passed."""
+
+def _count_bits(mask):
+    return bin(mask).count("1")
+
+# --- Move orderings ---
+# Each takes (solver, game_state, tiles) and returns the tiles in the order to try them.
+# They only change how quickly a win is proven, never the result.
+
+def order_none(solver, game_state, tiles):
+    return tiles
+
+def order_mobility(solver, game_state, tiles):
+    """Fewest opponent replies first (a move leaving none wins on the spot)."""
+    player = game_state.current_index
+    replies = {}
+    for tile in tiles:
+        game_state.play(player, tile)
+        game_state.next_player()
+        replies[tile] = _count_bits(game_state.legal_mask(game_state.current_index))
+        game_state.undo_move()
+    return sorted(tiles, key=replies.__getitem__)
+
+def order_killer(solver, game_state, tiles):
+    """The last move that won at this ply first."""
+    killer = solver.killers.get(len(game_state.history))
+    if killer in tiles:
+        tiles.remove(killer)
+        tiles.insert(0, killer)
+    return tiles
+
+def order_history(solver, game_state, tiles):
+    """Moves to the tiles that have won most often so far first."""
+    return sorted(tiles, key=lambda tile: -solver.history[tile])
+
+MOVE_ORDERINGS = {
+    "none": order_none,
+    "mobility": order_mobility,
+    "killer": order_killer,
+    "history": order_history,
+}
+
+# Process pool for parallel root splitting, created on first use and kept for every later
+# parallel solve in this process: (workers, executor, stop flags)
+_root_pool = None
+_snapshot_ids = itertools.count()
+
+# In the pool's workers: one stop flag per root tile, and the last memo snapshot received
+_worker_stop_flags = None
+_worker_snapshot = (None, {})
+
+def _init_root_worker(stop_flags):
+    global _worker_stop_flags
+    _worker_stop_flags = stop_flags
+
+def _get_root_pool(workers):
+    """Return (executor, stop flags) of the shared pool, (re)creating it for this number of workers."""
+    global _root_pool
+    if _root_pool is None or _root_pool[0] != workers:
+        if _root_pool is not None:
+            _root_pool[1].shutdown()
+        stop_flags = multiprocessing.RawArray('b', TILE_COUNT)
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_root_worker, initargs=(stop_flags,))
+        _root_pool = (workers, executor, stop_flags)
+    return _root_pool[1], _root_pool[2]
+
+class _StopFlag():
+    """stop_event of a root move worker: set once the caller sets the move's flag."""
+
+    def __init__(self, tile):
+        self.tile = tile
+
+    def is_set(self):
+        return bool(_worker_stop_flags[self.tile])
+
+class _LayeredMemo(dict):
+    """A worker's new memo entries, read through to a snapshot of the caller's memo."""
+
+    def __init__(self, base):
+        super().__init__()
+        self.base = base
+
+    def get(self, key, default=None):
+        value = dict.get(self, key)
+        return value if value is not None else self.base.get(key, default)
+
+def _solve_root_move(game_state, tile, solver_class, settings, snapshot_id, snapshot):
+    """Worker for parallel root splitting: solve the position after tile is played."""
+    global _worker_snapshot
+    if _worker_snapshot[0] != snapshot_id:
+        # Every move of a solve shares one snapshot: unpickle it once per worker
+        _worker_snapshot = (snapshot_id, pickle.loads(snapshot))
+    game_state.play(game_state.current_index, tile)
+    game_state.next_player()
+    solver = solver_class(game_state, memo=_LayeredMemo(_worker_snapshot[1]), **settings)
+    solver.stop_event = _StopFlag(tile)
+    try:
+        opponent_wins = solver.solve(game_state)
+    except SearchAborted:
+        opponent_wins = None
+    # Every stored entry is exact, even when the search was cut short
+    return tile, opponent_wins, dict(solver.memoized_states)
+
 class Solver():
-    def __init__(self, game_state):
+    def __init__(self, game_state, use_symmetry=SOLVER_USE_SYMMETRY, memo=None, ordering=SOLVER_MOVE_ORDERING,
+                 decompose=SOLVER_DECOMPOSE_REGIONS, normalize_dead=SOLVER_NORMALIZE_DEAD_TILES):
+        """
+        memo: an existing memo to read and extend, typically a TranspositionTable shared
+        across turns and games. A fresh dict is used by default.
+        ordering: a name from MOVE_ORDERINGS, or a function with the same signature.
+        decompose: settle positions where the players are cut off from each other
+        without searching them (see solve_separated).
+        normalize_dead: leave tiles neither player can reach again out of memo keys (see dead_tiles).
+        """
         self.game_state = game_state
-        self.memoized_states = {}
+        self.use_symmetry = use_symmetry
+        self.ordering = MOVE_ORDERINGS[ordering] if isinstance(ordering, str) else ordering
+        self.killers = {}  # ply -> last winning tile at that ply
+        self.history = [0] * TILE_COUNT  # tile -> number of wins found by moving there
+        self.memoized_states = memo if memo is not None else {}
+        self.decompose = decompose
+        self.normalize_dead = normalize_dead
+        self.region_cache = {}  # (values, blocked tiles, tile) -> longest move sequence, see longest_sequence
+        self.nodes = 0  # positions visited by searches with this solver
+        self.stop_event = None  # searches raise SearchAborted once this event is set
+        self.stop_check_interval = STOP_CHECK_INTERVAL  # nodes between checks of stop_event and deadline
+        self.deadline = None  # time.perf_counter() value at which timed searches give up
 
     def canonical(self, game_state):
-        """Return a hashable representation of the game state."""
-        board_tuple = tuple(
-            tuple((card.value, card.collapsed) for card in row) for row in game_state.board
-        )
-        positions = tuple((p.position for p in game_state.players))
-        return (board_tuple, game_state.current_index, positions)
-        # return (tuple(map(tuple, game_state.board)), game_state.current_player.name)
+        """
+        Return (key, g): the 64-bit memo key of the game state, and the index of the
+        symmetry mapping it onto the stored representative. Winning moves are
+        memoized in the representative's frame. Without symmetry reduction the key
+        is the plain Zobrist hash and g is 0, the identity.
+        """
+        # Hash dead tiles as if they had collapsed: the rest of the game is the same either way
+        dead = self.dead_tiles(game_state) if self.normalize_dead else 0
+        if not self.use_symmetry:
+            key = game_state.hash
+            for tile in iter_tiles(dead):
+                key ^= Z_VALUE[tile][game_state.card_code(tile)]
+            return key, 0
+        packed = game_state.sym_hash
+        for tile in iter_tiles(dead):
+            packed ^= PZ_VALUE[tile][game_state.card_code(tile)]
+        return canonical_hash(packed)
+
+    def dead_tiles(self, game_state):
+        """
+        Bitmask of the tiles that have not collapsed but that no player can ever reach
+        again: they are cut off from every player's region of open tiles, and regions
+        only shrink as tiles collapse.
+        """
+        regions = components(~game_state.collapsed & ALL_TILES)
+        if len(regions) == 1:
+            return 0  # a player stands in it
+        players = 0
+        for position, active in zip(game_state.positions, game_state.active):
+            if active:
+                players |= 1 << position
+        dead = 0
+        for region in regions:
+            if not region & players:
+                dead |= region
+        return dead
+
+    def longest_sequence(self, values, blocked, origin):
+        """
+        Most moves a player alone on the board can still make from origin, where blocked
+        is the bitmask of collapsed tiles plus every tile outside the player's region.
+        """
+        key = (values, blocked, origin)
+        longest = self.region_cache.get(key)
+        if longest is not None:
+            return longest
+        self.nodes += 1
+        longest = 0
+        limit = TILE_COUNT - _count_bits(blocked) - 1  # at most one move per open tile besides origin
+        code = (values >> (VALUE_BITS * origin)) & VALUE_MASK
+        for tile in iter_tiles(destinations_mask(CODE_PATHS[origin][code], blocked)):
+            longest = max(longest, 1 + self.longest_sequence(values, blocked | 1 << origin, tile))
+            if longest == limit:
+                break
+        self.region_cache[key] = longest
+        return longest
+
+    def solve_separated(self, game_state):
+        """
+        Once the collapsed tiles cut the players off from each other, every move
+        stays within its player's region of open tiles and the players no longer
+        interact: each can only make as many moves as possible, and the player to
+        move wins if it can make more moves than the opponent. The two regions are
+        solved on their own, which costs the sum of their sizes instead of the product.
+        Returns a winning tile, LOSS, or None if the players are not separated.
+        """
+        if len(game_state.positions) != 2:
+            return None
+        mover = game_state.current_index
+        opponent = 1 - mover
+        values, positions = game_state.values, game_state.positions
+        open_tiles = ~game_state.collapsed & ALL_TILES
+        region = flood_fill(open_tiles, positions[mover], 1 << positions[opponent])
+        if region >> positions[opponent] & 1:
+            return None
+        # Tiles outside a region are as good as collapsed for its player, which also
+        # keys the region cache on that region alone
+        opponent_region = flood_fill(open_tiles, positions[opponent])
+        opponent_moves = self.longest_sequence(values, ~opponent_region & ALL_TILES, positions[opponent])
+        blocked = ~region & ALL_TILES | 1 << positions[mover]
+        for tile in iter_tiles(game_state.legal_mask(mover)):
+            if 1 + self.longest_sequence(values, blocked, tile) > opponent_moves:
+                return tile
+        return LOSS
+
+    def memoize_separated(self, game_state, key, g):
+        """Store the result of solve_separated under key. Returns whether the player to move wins, or None."""
+        tile = self.solve_separated(game_state)
+        if tile is None:
+            return None
+        self.memoized_states[key] = LOSS if tile == LOSS else SYMMETRIES[g][tile]
+        return tile != LOSS
 
     def solve(self, game_state):
-        key = self.canonical(game_state)
-        if key in self.memoized_states:
-            return self.memoized_states[key]
-
-        if game_state.is_terminal:
-            self.memoized_states[key] = (False, None)  # current player loses
-            return False
-
-        for move in sorted(game_state.get_current_player_moves()):
-            # Work on a copy
-            new_game_state = deepcopy(game_state)
-            new_game_state.make_move(new_game_state.current_player, move)
-            new_game_state.next_player()
-            if not self.solve(new_game_state):  # opponent loses ⇒ current wins
-                self.memoized_states[key] = (True, move)  # winning, store this move
+        """Solve a BitboardState. Returns True if the player to move can force a win."""
+        self.nodes += 1
+        if self.stop_event is not None and not self.nodes % self.stop_check_interval and self.stop_event.is_set():
+            raise SearchAborted
+        key, g = self.canonical(game_state)
+        result = self.memoized_states.get(key)
+        if result is not None:
+            return result != LOSS
+        if self.decompose:
+            wins = self.memoize_separated(game_state, key, g)
+            if wins is not None:
+                return wins
+
+        tiles = list(iter_tiles(game_state.legal_mask(game_state.current_index)))
+        for tile in self.ordering(self, game_state, tiles):
+            # Search the child in place, then take the move back
+            game_state.play(game_state.current_index, tile)
+            game_state.next_player()
+            opponent_wins = self.solve(game_state)
+            game_state.undo_move()
+            if not opponent_wins:  # opponent loses ⇒ current wins
+                self.memoized_states[key] = SYMMETRIES[g][tile]  # winning, store this move
+                self.killers[len(game_state.history)] = tile
+                self.history[tile] += 1
+                return True
+
+        self.memoized_states[key] = LOSS  # no moves, or every move lets the opponent win
+        return False
+
+    def solve_root(self, game_state):
+        """
+        Like solve(), but always tries the moves in sorted (row, col) order, so the
+        chosen move is the same whatever move ordering is used below the root.
+        """
+        self.nodes += 1
+        key, g = self.canonical(game_state)
+        # Tiles come out in ascending index order, i.e. sorted (row, col) order
+        for tile in iter_tiles(game_state.legal_mask(game_state.current_index)):
+            game_state.play(game_state.current_index, tile)
+            game_state.next_player()
+            opponent_wins = self.solve(game_state)
+            game_state.undo_move()
+            if not opponent_wins:
+                self.memoized_states[key] = SYMMETRIES[g][tile]
                 return True
-                
-        self.memoized_states[key] = (False, None)
-        # print(len(memoized_states.keys()))
+
+        self.memoized_states[key] = LOSS
+        return False
+
+    def best_moves(self, game_state, workers=SOLVER_WORKERS):
+        """
+        Returns (is_winning, winning_move)
+        If losing, the move is None.
+        Accepts either a GameState or a BitboardState.
+        With workers > 1 the root moves are solved in parallel processes.
+        """
+        if not isinstance(game_state, BitboardState):
+            game_state = BitboardState.from_game_state(game_state)
+        key, g = self.canonical(game_state)
+        if self.memoized_states.get(key) is None:
+            if workers > 1:
+                self.solve_parallel(game_state, workers)
+            else:
+                self.solve_root(game_state)  # ensures memo is populated
+        tile = self.memoized_states[key]
+        if tile == LOSS:
+            return (False, None)
+        return (True, to_position(INVERSE_SYMMETRIES[g][tile]))
+
+    def solve_parallel(self, game_state, workers):
+        """
+        Solve the root by handing each legal move to the shared process pool.
+        Workers are solvers of this class with the same settings, reading a snapshot
+        of this solver's memo. The first move proven winning is played: the other
+        workers are then stopped, so with several winning moves the choice can differ
+        from a serial search. The workers' new memo entries are merged into this
+        solver's memo, including those of aborted searches.
+        """
+        self.nodes += 1
+        key, g = self.canonical(game_state)
+        moves = list(iter_tiles(game_state.legal_mask(game_state.current_index)))
+        executor, stop_flags = _get_root_pool(workers)
+        stop_flags[:] = [0] * TILE_COUNT
+        settings = {"use_symmetry": self.use_symmetry, "ordering": self.ordering,
+                    "decompose": self.decompose, "normalize_dead": self.normalize_dead}
+        snapshot = pickle.dumps(dict(self.memoized_states.items()))
+        snapshot_id = (os.getpid(), next(_snapshot_ids))
+        futures = [executor.submit(_solve_root_move, game_state.copy(), tile, type(self), settings,
+                                   snapshot_id, snapshot)
+                   for tile in moves]
+        winning = None
+        try:
+            for future in as_completed(futures):
+                tile, opponent_wins, _ = future.result()
+                if opponent_wins is False:
+                    winning = tile
+                    break
+        finally:
+            # Stop every search still running and wait for it, so the pool is idle for the next solve
+            stop_flags[:] = [1] * TILE_COUNT
+            for future in futures:
+                future.cancel()
+            wait(futures)
+        for future in futures:
+            if not future.cancelled() and future.exception() is None:
+                self.memoized_states.update(future.result()[2])
+
+        if winning is not None:
+            self.memoized_states[key] = SYMMETRIES[g][winning]
+            return True
+        self.memoized_states[key] = LOSS
         return False
 
-    def best_moves(self, game_state):
+    def mobility_score(self, game_state):
+        """Heuristic for unsolved positions at the search horizon: own moves minus opponent moves."""
+        mover = game_state.current_index
+        own = _count_bits(game_state.legal_mask(mover))
+        other = sum(_count_bits(game_state.legal_mask(i)) for i in range(len(game_state.positions))
+                    if i != mover and game_state.active[i])
+        return own - other
+
+    def search(self, game_state, depth, alpha, beta):
         """
-        Returns (is_winning, list_of_winning_moves)
-        If losing, the list is empty.
+        Depth-limited alpha-beta (fail-soft, negamax). Returns +-WIN_SCORE for proven
+        results, which are also stored in the memo, or a heuristic score otherwise.
         """
-        self.solve(game_state)  # ensures memo is populated
-        key = self.canonical(game_state)
-        return self.memoized_states[key]
+        self.nodes += 1
+        if not self.nodes % self.stop_check_interval and time.perf_counter() > self.deadline:
+            raise SearchAborted
+        key, g = self.canonical(game_state)
+        result = self.memoized_states.get(key)
+        if result is not None:
+            return WIN_SCORE if result != LOSS else -WIN_SCORE
+        if self.decompose:
+            wins = self.memoize_separated(game_state, key, g)
+            if wins is not None:
+                return WIN_SCORE if wins else -WIN_SCORE
+
+        moves = game_state.legal_mask(game_state.current_index)
+        if not moves:
+            self.memoized_states[key] = LOSS
+            return -WIN_SCORE
+        if depth == 0:
+            return self.mobility_score(game_state)
+
+        best_score = -WIN_SCORE - 1
+        for tile in self.ordering(self, game_state, list(iter_tiles(moves))):
+            game_state.play(game_state.current_index, tile)
+            game_state.next_player()
+            try:
+                score = -self.search(game_state, depth - 1, -beta, -alpha)
+            finally:
+                game_state.undo_move()  # also when the deadline unwinds the search
+            if score > best_score:
+                best_score = score
+                best_tile = tile
+            alpha = max(alpha, score)
+            # Stop at a proven win too: searching the siblings with alpha == WIN_SCORE
+            # would let them return +-WIN_SCORE as mere bounds
+            if alpha >= beta or score == WIN_SCORE:
+                self.killers[len(game_state.history)] = tile
+                break
+
+        # No window bound ever reaches +-WIN_SCORE, so those scores are exact results
+        if best_score == WIN_SCORE:
+            self.memoized_states[key] = SYMMETRIES[g][best_tile]
+        elif best_score == -WIN_SCORE:
+            self.memoized_states[key] = LOSS
+        return best_score
+
+    def timed_best_moves(self, game_state, time_budget=SOLVER_TIME_BUDGET):
+        """
+        Anytime version of best_moves for interactive play.
+        Searches with iterative deepening until the result is proven or time_budget
+        seconds have passed, and returns (is_winning, move, proven):
+        - proven: whether the verdict is exact
+        - is_winning: True only for a proven win
+        - move: the best move found so far (a winning one when proven winning, any
+          legal move when proven losing), or None if there are no legal moves
+        """
+        if not isinstance(game_state, BitboardState):
+            game_state = BitboardState.from_game_state(game_state)
+        key, g = self.canonical(game_state)
+        tile = self.memoized_states.get(key)
+        if tile is not None and tile != LOSS:
+            return (True, to_position(INVERSE_SYMMETRIES[g][tile]), True)
+
+        moves = list(iter_tiles(game_state.legal_mask(game_state.current_index)))
+        if not moves:
+            return (False, None, True)
+
+        self.deadline = time.perf_counter() + time_budget
+        best_tile, best_score = moves[0], 0
+        depth = 1
+        try:
+            while abs(best_score) != WIN_SCORE and depth <= TILE_COUNT:
+                # Try the previous iteration's best move first
+                ordered = [best_tile] + [tile for tile in moves if tile != best_tile]
+                alpha = -WIN_SCORE - 1
+                iteration_tile = ordered[0]
+                for tile in ordered:
+                    game_state.play(game_state.current_index, tile)
+                    game_state.next_player()
+                    try:
+                        score = -self.search(game_state, depth - 1, -WIN_SCORE - 1, -alpha)
+                    finally:
+                        game_state.undo_move()
+                    if score > alpha:
+                        alpha, iteration_tile = score, tile
+                    if alpha == WIN_SCORE:
+                        break  # proven win, see search
+                best_tile, best_score = iteration_tile, alpha
+                depth += 1
+        except SearchAborted:
+            pass  # keep the last completed iteration
+        finally:
+            self.deadline = None
+
+        proven = abs(best_score) == WIN_SCORE
+        if proven:
+            self.memoized_states[key] = SYMMETRIES[g][best_tile] if best_score > 0 else LOSS
+        return (best_score == WIN_SCORE, to_position(best_tile), proven)
+
 
 if __name__ == "__main__":
     game_state = GameState(num_players=2)
@@ -124,3 +543,66 @@ if __name__ == "__main__":
         print("Computed winning move is:", moves)
     else:
         print(f"This state is LOSING for {s.game_state.current_player.name}")
+
+    # Compare the work each move ordering needs on the fixed positions above
+    def fixed_position(board, positions, current_index):
+        state = GameState(num_players=2)
+        state.board = [[Card(value.rstrip("x"), value.endswith("x")) for value in row.split()] for row in board]
+        for player, position in zip(state.players, positions):
+            player.position = position
+        state.current_index = current_index
+        return state
+
+    fixed_positions = [
+        fixed_position(["3 Joker Joker A", "A 4 A 3", "2 2 2 2", "4 3 3 A"], [(0, 1), (0, 2)], 0),
+        fixed_position(["3x Jokerx Jokerx 2x", "4x A A 3x", "2x 2 A 2x", "4x 3x 3x Ax"], [(1, 1), (2, 2)], 1),
+        fixed_position(["2 Joker 4 3", "A A A 2", "3 Joker 3 A", "4 2 2 3"], [(0, 1), (2, 1)], 0),
+        fixed_position(["Ax 2x 3 Jokerx", "A Ax 2 4", "4 3x 3 2", "A 2x 3 Jokerx"], [(3, 0), (1, 0)], 1),
+        fixed_position(["Jokerx 3x Ax Jokerx", "Ax Ax 3x 3x", "2 2 4 2", "3 2x A 4"], [(2, 0), (3, 0)], 1),
+        game_state,
+    ]
+    print("\nNodes searched per move ordering (verdict, move):")
+    for ordering in MOVE_ORDERINGS:
+        results = []
+        for state in fixed_positions:
+            s = Solver(state, ordering=ordering)
+            outcome = s.best_moves(state)
+            results.append("{} {}".format(s.nodes, outcome))
+        print("{:>9}: {}".format(ordering, " | ".join(results)))
+
+    # Every verdict the timed search writes to the memo must match the exhaustive solver
+    class RecordingMemo(dict):
+        """Memo that keeps a copy of the searched position with every entry written."""
+        def __init__(self, state):
+            super().__init__()
+            self.state = state  # searches play and undo moves on this object in place
+            self.writes = []
+
+        def __setitem__(self, key, value):
+            self.writes.append((self.state.copy(), value))
+            super().__setitem__(key, value)
+
+    import random
+    random.seed(0)
+    exact = Solver(None)
+    checked = wrong = 0
+    for _ in range(20):
+        state = BitboardState.from_game_state(GameState(num_players=2))
+        for _ in range(random.randint(3, 7)):
+            moves = list(iter_tiles(state.legal_mask(state.current_index)))
+            if not moves:
+                break
+            state.play(state.current_index, random.choice(moves))
+            state.next_player()
+        memo = RecordingMemo(state)
+        timed = Solver(state, memo=memo)
+        timed.timed_best_moves(state, time_budget=1)
+        for position, tile in memo.writes:
+            if tile != LOSS:
+                # A stored win is right if its move leaves the opponent lost
+                _, g = timed.canonical(position)
+                position.play(position.current_index, INVERSE_SYMMETRIES[g][tile])
+                position.next_player()
+            checked += 1
+            wrong += exact.solve(position)
+    print(f"\nTimed search memo entries contradicting the exhaustive solver: {wrong}/{checked}")
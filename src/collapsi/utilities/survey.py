@@ -0,0 +1,175 @@
+"""
+Exhaustive survey of the first player's chances under perfect play.
+
+Every deal is an arrangement of the 16 cards, with P1 on the first joker in
+row-major order and P2 on the second. Translating the torus so that P1 sits on
+tile 0 turns a deal into an opening given by
+- d: P2's tile (1 to 15), and
+- a filling of the other 14 tiles with A x4, 2 x4, 3 x4, 4 x2 (3,153,150 ways),
+and the 8 rotations/reflections that keep tile 0 in place map openings with the
+same outcome onto each other. Only the smallest opening of each such class is
+solved.
+
+Weights turn the solved classes back into deal counts. An opening (d, filling)
+comes from one deal per translation t that puts P1's joker before P2's in
+row-major order, i.e. W(d) = #{t : t < t + d} deals. A class is worth the sum of
+W over its distinct openings, and the weights of all classes add up to the
+16! / (2! 4! 4! 4! 2!) = 378,378,000 deals.
+
+The work is split into chunks (d, first cards of the filling). Each finished
+chunk appends one JSON line to the results file, and chunks already in the file
+are skipped, so the job can be stopped and resumed at any time (a line cut short
+by the stop is dropped and its chunk solved again).
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collapsi.configs.configs import *
+from collapsi.modules.bitboard import *
+from collapsi.utilities.solver import Solver
+from collapsi.utilities.transposition import TranspositionTable
+
+SURVEY_RESULTS_FILE = "first_player_survey.jsonl"
+# Memo size of each worker process: about 150 MB per million entries, so the solver's
+# default would take several GB over all cores, for a few percent fewer nodes per chunk
+SURVEY_MEMO_MAX_ENTRIES = 500_000
+
+# Cards of the 14 tiles besides the jokers, as {code: count}
+FILLING_COUNTS = {}
+for _card in CARD_VALUES:
+    if _card != 'Joker':
+        FILLING_COUNTS[CARD_TO_NUM[_card]] = FILLING_COUNTS.get(CARD_TO_NUM[_card], 0) + 1
+
+# Rotations/reflections of the torus that keep tile 0 in place
+FIXING_TILE_0 = [perm for perm in SYMMETRIES if perm[0] == 0]
+
+def _translate(tile, offset):
+    (r, c), (dr, dc) = to_position(tile), to_position(offset)
+    return to_tile(((r + dr) % BOARD_SIZE, (c + dc) % BOARD_SIZE))
+
+# DEAL_WEIGHTS[d]: translations that keep P1 (tile 0) before P2 (tile d) in row-major order
+DEAL_WEIGHTS = [0] + [sum(t < _translate(t, d) for t in range(TILE_COUNT)) for d in range(1, TILE_COUNT)]
+
+def _fillings(counts, length):
+    """Every sequence of `length` codes using at most counts[code] of each code."""
+    if not length:
+        yield ()
+        return
+    for code in sorted(counts):
+        if counts[code]:
+            counts[code] -= 1
+            for rest in _fillings(counts, length - 1):
+                yield (code,) + rest
+            counts[code] += 1
+
+def chunks(prefix_length=3):
+    """Every chunk of the survey as (d, prefix): the codes of the first prefix_length non-joker tiles."""
+    return [(d, prefix) for d in range(1, TILE_COUNT)
+            for prefix in _fillings(dict(FILLING_COUNTS), prefix_length)]
+
+def chunk_id(d, prefix):
+    return f"{d}:{''.join(map(str, prefix))}"
+
+def openings(d, prefix):
+    """Yield (codes, weight) for the canonical openings of a chunk, codes[tile] being each tile's card code."""
+    free = [tile for tile in range(1, TILE_COUNT) if tile != d]
+    counts = dict(FILLING_COUNTS)
+    for code in prefix:
+        counts[code] -= 1
+    for rest in _fillings(counts, len(free) - len(prefix)):
+        codes = [JOKER_CODE] * TILE_COUNT
+        for tile, code in zip(free, prefix + rest):
+            codes[tile] = code
+        codes = tuple(codes)
+        images = {}
+        for perm in FIXING_TILE_0:
+            image = [0] * TILE_COUNT
+            for tile, code in enumerate(codes):
+                image[perm[tile]] = code
+            images[tuple(image)] = perm[d]
+        if min(images) == codes:
+            yield codes, sum(DEAL_WEIGHTS[image_d] for image_d in images.values())
+
+_worker_memo = None
+
+def solve_chunk(d, prefix):
+    """Solve every canonical opening of a chunk and return its summary as a dict."""
+    global _worker_memo
+    if _worker_memo is None:
+        _worker_memo = TranspositionTable(SURVEY_MEMO_MAX_ENTRIES)
+    start = time.perf_counter()
+    positions = won = deals = deals_won = nodes = 0
+    for codes, weight in openings(d, prefix):
+        game_state = BitboardState.from_codes(codes)  # P1 on tile 0, P2 on tile d
+        solver = Solver(game_state, memo=_worker_memo)
+        first_player_wins, _ = solver.best_moves(game_state, workers=1)
+        positions += 1
+        deals += weight
+        nodes += solver.nodes
+        if first_player_wins:
+            won += 1
+            deals_won += weight
+    return {"chunk": chunk_id(d, prefix), "positions": positions, "positions_won": won,
+            "deals": deals, "deals_won": deals_won, "nodes": nodes,
+            "seconds": round(time.perf_counter() - start, 3)}
+
+def load_results(path=SURVEY_RESULTS_FILE):
+    """
+    Return the chunk summaries already in the results file, by chunk id. A last
+    line without its newline was cut short while being written and is skipped,
+    so that its chunk gets solved again.
+    """
+    return _read_results(path)[0]
+
+def _read_results(path):
+    """load_results(path), and the size in bytes of the file up to the end of its last whole line."""
+    results = {}
+    size = 0
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    result = json.loads(line)
+                    results[result["chunk"]] = result
+                size += len(line)
+    return results, size
+
+def summarize(results):
+    deals = sum(result["deals"] for result in results.values())
+    deals_won = sum(result["deals_won"] for result in results.values())
+    positions = sum(result["positions"] for result in results.values())
+    positions_won = sum(result["positions_won"] for result in results.values())
+    return deals, deals_won, positions, positions_won
+
+def run_survey(path=SURVEY_RESULTS_FILE, workers=None, prefix_length=3):
+    """Solve every chunk not yet in the results file over a process pool (all cores by default)."""
+    results, size = _read_results(path)
+    todo = [chunk for chunk in chunks(prefix_length) if chunk_id(*chunk) not in results]
+    total = len(todo) + len(results)
+    print(f"{len(results)}/{total} chunks already done, {len(todo)} to go")
+
+    start = time.perf_counter()
+    with open(path, "a") as out, ProcessPoolExecutor(max_workers=workers) as executor:
+        out.truncate(size)  # drop a line cut short, so the next one starts on a line of its own
+        futures = [executor.submit(solve_chunk, d, prefix) for d, prefix in todo]
+        for finished, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            results[result["chunk"]] = result
+
+            elapsed = time.perf_counter() - start
+            eta = elapsed / finished * (len(todo) - finished)
+            deals, deals_won, positions, _ = summarize(results)
+            print(f"{len(results)}/{total} chunks, {positions} openings solved, "
+                  f"first player wins {deals_won / max(deals, 1):.2%} of deals so far, "
+                  f"elapsed {elapsed / 3600:.2f}h, ETA {eta / 3600:.2f}h")
+
+    deals, deals_won, positions, positions_won = summarize(results)
+    print(f"First player wins {deals_won}/{deals} deals ({deals_won / max(deals, 1):.3%}), "
+          f"{positions_won}/{positions} distinct openings")
+    return results
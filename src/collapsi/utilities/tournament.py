@@ -0,0 +1,152 @@
+"""
+Tournaments between any two policies.
+
+A policy is anything with a select(game_state, rng) method returning the tile
+index to move to, for the player to move in a BitboardState. POLICIES maps a
+name to a factory for each engine, so new engines only need an entry there.
+
+Games are reproducible: game i of a tournament with seed s uses the deal
+seeded by (s, i // 2) and a move rng seeded by (s, i). Consecutive games share
+a deal with colours swapped, so neither policy gets the luckier deals or
+always moves first. Games are spread over a process pool in which every worker
+builds its own policies once (solver memos, loaded networks) and keeps them
+across all the games it plays.
+"""
+
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collapsi.configs.configs import *
+from collapsi.modules.bitboard import *
+from collapsi.utilities.solver import Solver
+from collapsi.utilities.transposition import TranspositionTable
+
+class RandomPolicy():
+    def select(self, game_state, rng):
+        return rng.choice(list(iter_tiles(game_state.legal_mask(game_state.current_index))))
+
+class SolverPolicy():
+    """Plays a proven win when there is one and a random move otherwise, like the CSB scripts."""
+
+    def __init__(self, solver_class=Solver):
+        self.solver_class = solver_class
+        self.memo = TranspositionTable()
+
+    def select(self, game_state, rng):
+        win, move = self.solver_class(game_state, memo=self.memo).best_moves(game_state, workers=1)
+        if win:
+            return to_tile(move)
+        return rng.choice(list(iter_tiles(game_state.legal_mask(game_state.current_index))))
+
+class DQNPolicy():
+    """Greedy legal move of a trained DQN (an exported model or a state dict, see inference.py)."""
+
+    def __init__(self, path=None):
+        import torch
+        from collapsi.modules.inference import load_policy
+        torch.set_num_threads(1)  # the pool already uses every core
+        self.policy = load_policy(path)
+
+    def select(self, game_state, rng):
+        from collapsi.modules.encoding import encode_bitboards
+        player = game_state.current_index
+        state_vec = encode_bitboards([game_state], [player])
+        legal = [[bool(game_state.legal_mask(player) >> tile & 1) for tile in range(TILE_COUNT)]]
+        return int(self.policy.select_actions(state_vec, legal)[0])
+
+def _proof_number_policy():
+    from collapsi.utilities.pns import ProofNumberSolver
+    return SolverPolicy(ProofNumberSolver)
+
+POLICIES = {
+    "random": RandomPolicy,
+    "solver": SolverPolicy,
+    "pns": _proof_number_policy,
+    "dqn": DQNPolicy,
+}
+
+def play_game(policies, deal_seed, move_seed):
+    """Play one game, policies[i] moving for seat i (seat 0 first). Returns (winning seat, plies)."""
+    game_state = deal(random.Random(deal_seed))
+    rng = random.Random(move_seed)
+    plies = 0
+    while not game_state.is_terminal:
+        player = game_state.current_index
+        game_state.play(player, policies[player].select(game_state, rng))
+        game_state.next_player()
+        plies += 1
+    # The player to move is stuck, so the other one made the last move and wins
+    return 1 - game_state.current_index, plies
+
+_worker_policies = None
+
+def _init_worker(names):
+    global _worker_policies
+    _worker_policies = [POLICIES[name]() for name in names]
+
+def _play_games(seed, indices):
+    """Play the given game indices; policy 0 has seat 0 in even games. Returns (policy 0 won, policy 0 first, plies) per game."""
+    results = []
+    for i in indices:
+        first = i % 2  # the policy with seat 0
+        seats = [_worker_policies[first], _worker_policies[1 - first]]
+        winner, plies = play_game(seats, f"deal-{seed}-{i // 2}", f"play-{seed}-{i}")
+        results.append(((winner == 0) == (first == 0), first == 0, plies))
+    return results
+
+def wilson_interval(wins, games, z=1.96):
+    """Wilson score interval for a win rate (95% by default)."""
+    if not games:
+        return (0.0, 1.0)
+    p = wins / games
+    denominator = 1 + z * z / games
+    center = (p + z * z / (2 * games)) / denominator
+    spread = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / denominator
+    return (center - spread, center + spread)
+
+def elo_difference(score):
+    """Elo rating difference implied by an expected score (clamped away from 0 and 1)."""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+def run_tournament(first, second, games=1000, workers=None, seed=0, chunk_size=100):
+    """
+    Play `games` games between the policies named first and second over `workers`
+    processes (all cores by default) and return a dict of results; see report().
+    """
+    indices = list(range(games))
+    chunks = [indices[i:i + chunk_size] for i in range(0, games, chunk_size)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=((first, second),)) as executor:
+        results = [result for chunk in executor.map(_play_games, [seed] * len(chunks), chunks) for result in chunk]
+    elapsed = time.perf_counter() - start
+
+    wins = sum(won for won, _, _ in results)
+    first_mover_wins = sum(won == moved_first for won, moved_first, _ in results)
+    return {
+        "policies": (first, second),
+        "games": games,
+        "wins": wins,
+        "win_rate": wins / games,
+        "win_rate_interval": wilson_interval(wins, games),
+        "elo": elo_difference(wins / games),
+        "elo_interval": tuple(elo_difference(bound) for bound in wilson_interval(wins, games)),
+        "first_player_win_rate": first_mover_wins / games,
+        "first_player_interval": wilson_interval(first_mover_wins, games),
+        "mean_plies": sum(plies for _, _, plies in results) / games,
+        "seconds": elapsed,
+        "games_per_second": games / elapsed,
+    }
+
+def report(results):
+    first, second = results["policies"]
+    low, high = results["win_rate_interval"]
+    elo_low, elo_high = results["elo_interval"]
+    fp_low, fp_high = results["first_player_interval"]
+    print(f"{first} vs {second}: {results['games']} games, colours alternating")
+    print(f"  {first} win rate: {results['win_rate']:.2%} (95% CI {low:.2%} - {high:.2%})")
+    print(f"  Elo difference: {results['elo']:+.0f} (95% CI {elo_low:+.0f} - {elo_high:+.0f})")
+    print(f"  First player win rate: {results['first_player_win_rate']:.2%} (95% CI {fp_low:.2%} - {fp_high:.2%})")
+    print(f"  Mean game length: {results['mean_plies']:.1f} plies")
+    print(f"  {results['seconds']:.1f}s, {results['games_per_second']:.1f} games/s")
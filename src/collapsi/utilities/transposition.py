@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from collapsi.configs.configs import *
+
+class TranspositionTable():
+    """
+    Bounded memo for the Solver that can be shared across turns and games.
+
+    Keys are Zobrist hashes, which cover the card values, so entries stay valid
+    from one deal to the next. Once max_entries is reached the least recently
+    used entry is evicted. Evicting is always safe: the solver simply searches
+    that position again if it comes back.
+    """
+
+    def __init__(self, max_entries=SOLVER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def __getitem__(self, key):
+        return self.entries[key]
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def keys(self):
+        return self.entries.keys()
+
+    def items(self):
+        return self.entries.items()
+
+    def update(self, entries):
+        for key, value in dict(entries).items():
+            self[key] = value
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
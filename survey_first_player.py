@@ -0,0 +1,17 @@
+"""
+Solve the opening of every distinct deal to measure the first player's win rate
+under perfect play. Takes days of CPU time: progress is saved after every chunk,
+so it can be stopped and run again to resume.
+    python survey_first_player.py --workers 16
+"""
+
+import argparse
+from collapsi.utilities.survey import SURVEY_RESULTS_FILE, run_survey
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exhaustive first-player advantage survey")
+    parser.add_argument("--results", default=SURVEY_RESULTS_FILE, help="resumable JSONL results file")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores)")
+    args = parser.parse_args()
+
+    run_survey(args.results, workers=args.workers)
@@ -0,0 +1,23 @@
+"""
+BatchGameState deals its boards with NumPy, while single games are dealt through
+BitboardState.from_codes. Both must start the same game from the same board.
+"""
+
+import random
+import numpy as np
+from collapsi.configs.configs import *
+from collapsi.modules.batch_game import BatchGameState
+from collapsi.modules.bitboard import BitboardState, DECK_CODES, deal
+
+def test_batch_deals_match_from_codes():
+    batch = BatchGameState(200, rng=np.random.default_rng(0))
+    for game in range(batch.num_games):
+        state = BitboardState.from_codes(batch.codes[game])
+        assert sorted(batch.codes[game]) == sorted(DECK_CODES)
+        assert state.positions == list(batch.positions[game])
+        assert state.legal_mask(0) == batch.legal[game]
+
+def test_deal_is_reproducible():
+    first, second = deal(random.Random(7)), deal(random.Random(7))
+    assert (first.values, first.positions) == (second.values, second.positions)
+    assert [first.card_value(tile) for tile in first.positions] == ['Joker'] * NUMBER_OF_PLAYERS
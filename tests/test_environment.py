@@ -0,0 +1,85 @@
+"""
+VecCollapsiEnv against the single-game training loop train.py used before it.
+
+legacy_agent_turn replays one agent turn the way that loop did and returns the
+transitions it remembered. The environment must give the same observation,
+reward and done flag. It differs on purpose in two ways (see environment.py):
+- next_state is the agent's next decision point, after the opponent's reply,
+  instead of the position right after the agent's own move
+- a lost game gives one LOSS transition instead of a survive transition followed
+  by a duplicate LOSS one
+"""
+
+import numpy as np
+from collapsi.configs.configs import *
+from collapsi.modules.card import Card
+from collapsi.modules.encoding import encode_state
+from collapsi.modules.environment import VecCollapsiEnv
+from collapsi.modules.game import GameState
+
+NUM_TO_CARD = {code: card for card, code in CARD_TO_NUM.items()}
+
+def first_legal(batch, legal, rng):
+    """Deterministic opponent: the legal tile with the lowest index."""
+    return legal.argmax(axis=1)
+
+def game_from_env(env, game=0):
+    """A GameState with the deal of one of the environment's games, before any move."""
+    state = GameState(num_players=2)
+    codes = env.batch.codes[game]
+    state.board = [[Card(NUM_TO_CARD[int(codes[r * BOARD_SIZE + c])]) for c in range(BOARD_SIZE)]
+                   for r in range(BOARD_SIZE)]
+    state.players = state.init_players(2)
+    return state
+
+def legacy_agent_turn(game, action, previous_enemy_moves):
+    """
+    Play the agent's (P1) action and P2's reply as train.py's old loop did, with P2
+    playing first_legal. Returns (transitions, enemy moves for the next turn), each
+    transition being the (state, action, reward, next_state, done) it remembered.
+    """
+    agent, enemy = game.players
+    start = encode_state(game, agent_name='P1')
+    game.make_move(agent, divmod(action, BOARD_SIZE))
+    end = encode_state(game, agent_name='P1')
+
+    legal_moves = game.get_player_moves(enemy)
+    if not legal_moves:
+        return [(start, action, AGENT_REWARDS['WIN'], end, True)], previous_enemy_moves
+    game.make_move(enemy, min(legal_moves))
+    scale = 1
+    if len(legal_moves) < previous_enemy_moves:
+        scale = 1 + abs(len(legal_moves) - previous_enemy_moves)
+    transitions = [(start, action, scale * AGENT_REWARDS['SURVIVE_ANOTHER_ROUND'], end, False)]
+    if not game.get_player_moves(agent):
+        transitions.append((start, action, AGENT_REWARDS['LOSS'], end, True))
+    return transitions, len(legal_moves)
+
+def test_step_matches_legacy_loop():
+    rng = np.random.default_rng(0)
+    outcomes = set()
+    for seed in range(40):
+        env = VecCollapsiEnv(1, opponent=first_legal, rng=np.random.default_rng(seed))
+        observations, legal = env.reset()
+        game = game_from_env(env)
+        enemy_moves = len(game.get_player_moves(game.players[1]))
+        done = False
+        while not done:
+            action = int(rng.choice(np.flatnonzero(legal[0])))
+            transitions, enemy_moves = legacy_agent_turn(game, action, enemy_moves)
+            state, _, reward, _, legacy_done = transitions[-1]
+
+            assert np.allclose(observations[0], state)
+            observations, legal, rewards, dones, info = env.step(np.array([action]))
+            done = bool(dones[0])
+            assert rewards[0] == reward
+            assert done == legacy_done
+            # Differences by design: the next state includes the opponent's reply...
+            assert np.allclose(info["final_observation"][0], encode_state(game, agent_name='P1'))
+            # ...and a loss is no longer preceded by a survive transition for the same move
+            assert len(transitions) == (2 if reward == AGENT_REWARDS['LOSS'] else 1)
+            outcomes.add(reward)
+        # Finished games are dealt again straight away
+        assert info["winner"][0] in (0, 1)
+        assert env.batch.collapsed[0] == 0
+    assert {AGENT_REWARDS['WIN'], AGENT_REWARDS['LOSS']} <= outcomes
@@ -0,0 +1,19 @@
+"""
+Resuming the survey from a results file whose last line was cut short.
+"""
+
+import json
+from collapsi.utilities.survey import _read_results, load_results
+
+def test_load_results_skips_a_cut_short_last_line(tmp_path):
+    path = tmp_path / "survey.jsonl"
+    done = [{"chunk": "1:111", "deals": 3}, {"chunk": "1:112", "deals": 5}]
+    whole = "".join(json.dumps(result) + "\n" for result in done)
+    path.write_text(whole + json.dumps({"chunk": "1:113", "deals": 7})[:-4])
+
+    assert load_results(path) == {result["chunk"]: result for result in done}
+    # run_survey truncates the file to this size before appending
+    assert _read_results(path)[1] == len(whole.encode())
+
+def test_load_results_without_a_file(tmp_path):
+    assert load_results(tmp_path / "missing.jsonl") == {}